@@ -0,0 +1,42 @@
+import os
+import asyncio
+import secrets
+from fastapi import APIRouter, Header, HTTPException
+import rag_engine
+from readiness import readiness
+from chat_writer import chat_writer
+from conversation_cache import conversation_cache
+
+router = APIRouter(prefix="/admin")
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def check_token(token):
+    # No ADMIN_TOKEN configured = admin endpoints disabled
+    if not ADMIN_TOKEN or not token or not secrets.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@router.get("/vectorstore")
+def vectorstore_version(x_admin_token: str = Header(None)):
+    check_token(x_admin_token)
+    return {"version": rag_engine.current_version, "readiness": readiness.snapshot()}
+
+
+@router.post("/vectorstore/reload")
+async def reload_vectorstore(force: bool = False, x_admin_token: str = Header(None)):
+    """Load the bucket's current version now (instead of waiting for the poller) and swap it in"""
+    check_token(x_admin_token)
+    try:
+        version = await asyncio.to_thread(rag_engine.refresh_vectorstore, force)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Reload failed: {e}")
+    return {"version": version}
+
+
+@router.get("/conversations")
+def conversation_stats(x_admin_token: str = Header(None)):
+    """Conversation cache hit rate and chat writer queue"""
+    check_token(x_admin_token)
+    return {"cache": conversation_cache.stats(), "writer": chat_writer.stats()}
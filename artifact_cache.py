@@ -0,0 +1,133 @@
+import os
+import shutil
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+CACHE_DIR = os.getenv("ARTIFACT_CACHE_DIR", "/tmp/vectorstore/cache")
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "4"))
+VERIFY_CACHED = os.getenv("ARTIFACT_CACHE_VERIFY", "true").lower() == "true"   # re-hash cache hits
+
+
+class IntegrityError(Exception):
+    """A downloaded or cached artifact doesn't match its manifest entry"""
+
+
+def sha256_file(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(entry):
+    """Content address for a manifest entry: sha256 when published with one, else the ETag"""
+    if entry.get("sha256"):
+        return f"sha256-{entry['sha256']}"
+    if entry.get("etag"):
+        return f"etag-{entry['etag'].strip(chr(34))}"
+    return None
+
+
+def link_into_place(blob, dest):
+    """Hard-link the cached blob to dest via a temp name + rename (old inode stays valid for readers)"""
+    if os.path.exists(dest) and os.path.samefile(blob, dest):
+        return
+    tmp = f"{dest}.{os.getpid()}.{threading.get_ident()}.link"
+    try:
+        os.link(blob, tmp)
+    except OSError:
+        shutil.copyfile(blob, tmp)   # cache on another filesystem
+    os.replace(tmp, dest)
+
+
+class ArtifactCache:
+    """
+    Content-addressed store of downloaded artifacts (CACHE_DIR/<key>). Version folders
+    hard-link into it, so a restart or a new version only downloads files whose
+    content changed. Downloads stream to a temp file, are checked against the
+    manifest's sha256/size, and only then renamed into the cache.
+    """
+
+    def __init__(self, storage, bucket, cache_dir=CACHE_DIR):
+        self.storage = storage
+        self.bucket = bucket
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _check(self, path, entry, digest=None, size=None):
+        size = os.path.getsize(path) if size is None else size
+        if entry.get("size") is not None and size != entry["size"]:
+            raise IntegrityError(f"{entry['path']}: size {size} != {entry['size']}")
+        if entry.get("sha256"):
+            digest = digest or sha256_file(path)
+            if digest != entry["sha256"]:
+                raise IntegrityError(f"{entry['path']}: sha256 mismatch")
+
+    def _cached(self, blob, entry):
+        if not os.path.exists(blob):
+            return False
+        try:
+            if VERIFY_CACHED:
+                self._check(blob, entry)
+            return True
+        except IntegrityError as e:
+            logger.warning(f"⚠️ Dropping corrupt cache entry: {e}")
+            os.remove(blob)
+            return False
+
+    def fetch(self, entry, dest):
+        """Put the artifact described by entry at dest; returns True on a cache hit"""
+        key = cache_key(entry)
+        blob = os.path.join(self.cache_dir, key) if key else None
+
+        if blob and self._cached(blob, entry):
+            link_into_place(blob, dest)
+            return True
+
+        tmp = f"{blob or dest}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            result = self.storage.download_stream(entry["path"], tmp, self.bucket, compression=entry.get("compression"))
+            self._check(tmp, entry, digest=result["sha256"], size=result["size"])
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        if blob:
+            os.replace(tmp, blob)
+            link_into_place(blob, dest)
+        else:
+            os.replace(tmp, dest)
+        return False
+
+    def fetch_all(self, files, folder):
+        """Fetch {name: entry} into folder concurrently; returns (hits, downloads)"""
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_CONCURRENCY, thread_name_prefix="fetch") as pool:
+            futures = {
+                name: pool.submit(self.fetch, entry, os.path.join(folder, name))
+                for name, entry in files.items()
+            }
+            hits = sum(future.result() for future in futures.values())
+        return hits, len(files) - hits
+
+
+def prune_cache(cache_dir=CACHE_DIR):
+    """
+    Remove blobs no version folder links to any more (link count 1).
+    Assumes the cache and version folders share a filesystem, as with the defaults.
+    """
+    removed = 0
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.endswith((".part", ".link")) or not os.path.isfile(path):
+            continue
+        if os.stat(path).st_nlink == 1:
+            os.remove(path)
+            removed += 1
+    return removed
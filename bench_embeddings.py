@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+import asyncio
+import numpy as np
+from embedding_engine import BACKENDS, EmbeddingEngine
+from chunk_store import ChunkStore, has_chunk_store
+
+N_DOCS = int(os.getenv("BENCH_DOCS", "2000"))
+N_QUERIES = int(os.getenv("BENCH_QUERIES", "200"))
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "16"))
+
+QUERIES = [
+    "What services does Primis Digital offer?",
+    "How can I contact the team?",
+    "Do you build mobile apps?",
+    "Tell me about your cloud migration work",
+]
+
+
+def load_texts(folder="vectorstore"):
+    """Real chunks when a chunk store exists locally, synthetic ones otherwise"""
+    if has_chunk_store(folder):
+        store = ChunkStore(folder)
+        return [store.text(i) for i in range(min(N_DOCS, len(store)))]
+    words = "primis digital software cloud data mobile web design team project client".split()
+    rng = np.random.default_rng(0)
+    return [" ".join(rng.choice(words, size=rng.integers(10, 90))) for _ in range(N_DOCS)]
+
+
+def percentiles(latencies):
+    ms = np.asarray(latencies) * 1000
+    return f"p50 {np.percentile(ms, 50):.1f} ms, p99 {np.percentile(ms, 99):.1f} ms"
+
+
+async def concurrent_queries(engine):
+    """CONCURRENCY clients issuing queries at once, so the micro-batcher can group them"""
+    latencies = []
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(query):
+        async with semaphore:
+            start = time.perf_counter()
+            await engine.aembed_query(query)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(QUERIES[i % len(QUERIES)]) for i in range(N_QUERIES)))
+    return latencies
+
+
+def bench(backend, texts, processes):
+    print(f"\n🔧 {backend} (processes={processes})")
+    engine = EmbeddingEngine(backend=backend, processes=processes)
+    try:
+        engine.encode_documents(texts[:64])   # warm-up (and pool start-up)
+
+        start = time.perf_counter()
+        engine.encode_documents(texts)
+        elapsed = time.perf_counter() - start
+        print(f"   📄 documents: {len(texts) / elapsed:,.0f} docs/s")
+
+        latencies = []
+        for i in range(N_QUERIES):
+            start = time.perf_counter()
+            engine.embed_query(QUERIES[i % len(QUERIES)])
+            latencies.append(time.perf_counter() - start)
+        print(f"   🔍 sequential queries: {percentiles(latencies)}")
+
+        latencies = asyncio.run(concurrent_queries(engine))
+        print(f"   ⚡ concurrent queries (x{CONCURRENCY}): {percentiles(latencies)}, {engine.stats()['query_batches']}")
+    finally:
+        engine.close()
+
+
+if __name__ == "__main__":
+    backends = sys.argv[1:] or list(BACKENDS)
+    processes = int(os.getenv("EMBED_PROCESSES", "0"))
+    texts = load_texts()
+    print(f"🧪 Embedding benchmark: {len(texts)} documents, {N_QUERIES} queries")
+    for backend in backends:
+        bench(backend, texts, processes)
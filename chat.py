@@ -1,21 +1,23 @@
 from datetime import datetime, timedelta
-import os, uuid
+import os, uuid, json, base64
 from fastapi import APIRouter, Form, HTTPException, Depends, Request, Response
-from sqlalchemy.orm import Session
-from database import SessionLocal
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+import database
+from database import get_async_db
 from models import Chat
+from chat_writer import chat_writer
+from conversation_cache import conversation_cache
+from chat_maintenance import CHAT_HISTORY_DAYS
 from datetime import datetime, timedelta
-from rag_engine import get_answer
+from rag_engine import (
+    get_answer_async, stream_answer_async, wait_until_ready, supports_source_filter, SourceFilterError
+)
+from readiness import NotReadyError
 
 router = APIRouter(prefix="/chat")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 
 # SESSION HANDLER
 def get_or_create_session(request: Request, response: Response):
@@ -31,24 +33,28 @@ def get_or_create_session(request: Request, response: Response):
         )
     return session_id
 
+def parse_urls(urls):
+    """Optional comma-separated page URLs a question should be answered from"""
+    return [url.strip() for url in urls.split(",") if url.strip()] if urls else None
+
 # LOAD CHAT HISTORY FOR CONTEXT
-def build_prompt(db, session_id, user_message, context_limit=10):
+async def build_prompt(db, session_id, user_message, context_limit=10):
     """
     Build prompt with recent chat history for context.
     context_limit: Number of recent exchanges to include (default 10)
     """
     seven_days_ago = datetime.utcnow() - timedelta(days=7)
 
-    chats = (
-        db.query(Chat)
-        .filter(
+    result = await db.execute(
+        select(Chat)
+        .where(
             Chat.session_id == session_id,
             Chat.created_at >= seven_days_ago
         )
         .order_by(Chat.created_at.desc())
         .limit(context_limit)
-        .all()
     )
+    chats = result.scalars().all()
 
     # Reverse to get chronological order
     chats = list(reversed(chats))
@@ -70,21 +76,25 @@ async def chat_main(
     response: Response,
     text: str = Form(...),
     user_id: str = Form("default_user"),
-    db: Session = Depends(get_db)
+    urls: str = Form(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Main chat endpoint - accepts form data
-    Uses RAG to answer from website content
+    Uses RAG to answer from website content (only from the given page urls, if any)
     """
     try:
         session_id = get_or_create_session(request, response)
+        if not request.cookies.get("session_id"):
+            await conversation_cache.start(session_id)
 
         # Get AI response using RAG
-        ai_text = get_answer(
+        ai_text = await get_answer_async(
             question=text,
             session_id=session_id,
-            db_session=db
-      )
+            db_session=db,
+            urls=parse_urls(urls)
+        )
 
 
 
@@ -96,9 +106,8 @@ async def chat_main(
             answer=ai_text,
             created_at=datetime.utcnow()
         )
-        db.add(new_chat)
-        db.commit()
-        db.refresh(new_chat)
+        # Write-behind: queued here, inserted in bulk by the chat writer
+        await chat_writer.put(new_chat)
 
         return {
             "message": ai_text,
@@ -106,41 +115,152 @@ async def chat_main(
             "status": "success"
         }
 
+    except NotReadyError:
+        raise   # 503 + Retry-After (main.py)
+    except SourceFilterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print("❌ Error:", str(e))
-        db.rollback()
         raise HTTPException(status_code=500, detail=f"AI generation failed: {str(e)}")
 
 
+def sse_event(data, event=None):
+    """Format one Server-Sent Event frame"""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+@router.post("/stream")
+async def chat_stream(
+    request: Request,
+    text: str = Form(...),
+    user_id: str = Form("default_user"),
+    urls: str = Form(None)
+):
+    """
+    Streaming chat endpoint - same form fields as /chat/
+    Sends Gemini tokens as SSE, saves the Chat row when the stream ends
+    """
+    # Before the 200 and the stream start, so a cold instance answers 503
+    await wait_until_ready()
+    if parse_urls(urls) and not supports_source_filter():
+        raise HTTPException(status_code=400, detail="Filtering by urls needs a vector store with a chunk store")
+
+    session_id = request.cookies.get("session_id") or str(uuid.uuid4())
+
+    async def event_stream():
+        db = None
+        parts = []
+        try:
+            # Own session (like get_async_db): request-scoped dependencies close before the body streams
+            if database.AsyncSessionLocal is not None:
+                db = database.AsyncSessionLocal()
+            if not request.cookies.get("session_id"):
+                await conversation_cache.start(session_id)
+            async for piece in stream_answer_async(
+                question=text,
+                session_id=session_id,
+                db_session=db,
+                urls=parse_urls(urls)
+            ):
+                parts.append(piece)
+                yield sse_event(piece)
+
+            # Without a database there is no chat history to save to
+            if db is not None:
+                new_chat = Chat(
+                    session_id=session_id,
+                    user_id=user_id,
+                    question=text,
+                    answer="".join(parts),
+                    created_at=datetime.utcnow()
+                )
+                await chat_writer.put(new_chat)
+
+            yield sse_event({"session_id": session_id, "status": "success"}, event="done")
+
+        except Exception as e:
+            print("❌ Stream Error:", str(e))
+            yield sse_event({"detail": f"AI generation failed: {str(e)}"}, event="error")
+        finally:
+            if db is not None:
+                await db.close()
+
+    response = StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    if not request.cookies.get("session_id"):
+        response.set_cookie(
+            key="session_id",
+            value=session_id,
+            httponly=True,
+            max_age = 60 * 60 * 24 * 7,    # 7days
+            samesite="lax"
+        )
+    return response
+
+
+def encode_cursor(chat):
+    """Opaque history cursor: the (created_at, id) of the last row on a page"""
+    raw = json.dumps([chat.created_at.isoformat(), chat.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, chat_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(chat_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("/history/{user_id}")
 async def get_chat_history(
     user_id: str,
     request: Request,
-    db: Session = Depends(get_db),
-    limit: int = 50
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    limit: int = 50,
+    cursor: str = None
 ):
     """
-    Get chat history for current session
-    Returns array directly so frontend .slice() works
+    Get chat history for current session, oldest first
+    Returns array directly so frontend .slice() works; when more rows follow,
+    the X-Next-Cursor header holds the cursor for the next page (keyset pagination)
     """
     session_id = request.cookies.get("session_id")
     if not session_id:
         return []
 
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
+    since = datetime.utcnow() - timedelta(days=CHAT_HISTORY_DAYS)
+    after = decode_cursor(cursor) if cursor else None
 
     try:
-        # Get last N messages in chronological order
-        chats = (
-            db.query(Chat)
-            .filter(
+        # One row past the page tells whether another page follows
+        # Short sessions are answered from the conversation cache
+        chats = await conversation_cache.history(session_id, since, limit + 1, after)
+        if chats is None:
+            # Next N messages in chronological order (ix_chats_info_session_created)
+            query = select(Chat).where(
                 Chat.session_id == session_id,
-                Chat.created_at >= seven_days_ago
+                Chat.created_at >= since
             )
-            .order_by(Chat.created_at.asc())
-            .limit(limit)
-            .all()
-        )
+            if after is not None:
+                query = query.where(tuple_(Chat.created_at, Chat.id) > tuple_(*after))
+            result = await db.execute(
+                query.order_by(Chat.created_at.asc(), Chat.id.asc()).limit(limit + 1)
+            )
+            chats = chat_writer.overlay(result.scalars().all(), session_id, limit + 1, newest_first=False, after=after)
+
+        if len(chats) > limit:
+            chats = chats[:limit]
+            # Turns still queued have no id to anchor a cursor; they open the next page instead
+            anchored = [i for i, chat in enumerate(chats) if chat.id is not None]
+            if anchored:
+                chats = chats[:anchored[-1] + 1]
+                response.headers["X-Next-Cursor"] = encode_cursor(chats[-1])
 
         return [
             {
@@ -0,0 +1,158 @@
+import os
+import sys
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, delete, text
+import database
+from models import Chat, ChatArchive
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+CHAT_HISTORY_DAYS = int(os.getenv("CHAT_HISTORY_DAYS", "7"))          # what /chat/history and the cookie cover
+CHAT_RETENTION_MODE = os.getenv("CHAT_RETENTION_MODE", "archive").lower()   # archive | delete | off
+CHAT_RETENTION_DAYS = int(os.getenv("CHAT_RETENTION_DAYS", str(CHAT_HISTORY_DAYS)))
+CHAT_RETENTION_BATCH = int(os.getenv("CHAT_RETENTION_BATCH", "1000"))  # rows per transaction
+CHAT_RETENTION_PAUSE_MS = float(os.getenv("CHAT_RETENTION_PAUSE_MS", "200"))   # between batches
+CHAT_RETENTION_INTERVAL = int(os.getenv("CHAT_RETENTION_INTERVAL", "3600"))    # seconds between runs
+
+# (index, columns) created on tables that predate them; create_all skips existing tables
+CHAT_INDEXES = [
+    ("ix_chats_info_session_created", "session_id, created_at"),
+    ("ix_chats_info_created_at", "created_at"),
+]
+# Covered by the composite index's leading column
+REDUNDANT_INDEXES = ["ix_chats_info_session_id"]
+MIGRATION_LOCK = 0x63686174   # pg advisory lock key held while chats_info indexes are (re)built
+
+
+async def migrate_chats_info():
+    """
+    Bring an existing chats_info up to the current indexes. Idempotent; on Postgres
+    the indexes are built CONCURRENTLY so inserts keep flowing. Migrations hold an
+    advisory lock, so an INVALID index seen under it is a leftover from an
+    interrupted build (not one in progress elsewhere) and is dropped and rebuilt.
+    """
+    async with database.async_engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        postgres = connection.dialect.name == "postgresql"
+        if postgres and not await connection.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": MIGRATION_LOCK}):
+            logger.info("⏭️ Another migration of chats_info is running, skipping")
+            return False
+        try:
+            await create_indexes(connection, postgres)
+        finally:
+            if postgres:
+                await connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK})
+
+    logger.info("✓ chats_info indexes up to date")
+    return True
+
+
+async def create_indexes(connection, postgres):
+    concurrently = "CONCURRENTLY " if postgres else ""
+    for name, columns in CHAT_INDEXES:
+        if postgres:
+            invalid = await connection.scalar(text(
+                "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+                "WHERE c.relname = :name AND NOT i.indisvalid"
+            ), {"name": name})
+            if invalid:
+                logger.warning(f"⚠️ Rebuilding invalid index {name}")
+                await connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        await connection.execute(text(
+            f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {Chat.__tablename__} ({columns})"
+        ))
+
+    for name in REDUNDANT_INDEXES:
+        await connection.execute(text(f"DROP INDEX {concurrently}IF EXISTS {name}"))
+
+
+async def trim_batch(cutoff, batch_size=CHAT_RETENTION_BATCH, mode=CHAT_RETENTION_MODE):
+    """Archive/delete up to batch_size rows older than cutoff in one short transaction"""
+    async with database.AsyncSessionLocal() as session:
+        async with session.begin():
+            doomed = (
+                select(Chat.id)
+                .where(Chat.created_at < cutoff)
+                .order_by(Chat.created_at)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)   # parallel workers take different rows
+            )
+            ids = (await session.execute(doomed)).scalars().all()
+            if not ids:
+                return 0
+
+            if mode == "archive":
+                columns = [column.name for column in Chat.__table__.columns]
+                await session.execute(
+                    insert(ChatArchive).from_select(columns, select(Chat.__table__).where(Chat.id.in_(ids)))
+                )
+            await session.execute(delete(Chat).where(Chat.id.in_(ids)))
+            return len(ids)
+
+
+async def trim_old_chats(days=CHAT_RETENTION_DAYS, mode=CHAT_RETENTION_MODE):
+    """Trim everything older than days, batch by batch with a pause in between"""
+    if mode == "off":
+        return 0
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    total = 0
+    while True:
+        trimmed = await trim_batch(cutoff, mode=mode)
+        total += trimmed
+        if trimmed < CHAT_RETENTION_BATCH:
+            break
+        await asyncio.sleep(CHAT_RETENTION_PAUSE_MS / 1000)
+
+    if total:
+        logger.info(f"🧹 Chat retention: {mode}d {total} rows older than {days} days")
+    return total
+
+
+class RetentionJob:
+    """Runs trim_old_chats every CHAT_RETENTION_INTERVAL seconds in the background"""
+
+    def __init__(self, interval=CHAT_RETENTION_INTERVAL):
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        if CHAT_RETENTION_MODE != "off" and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await trim_old_chats()
+            except Exception as e:
+                logger.error(f"❌ Chat retention run failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+retention_job = RetentionJob()
+
+
+async def main(args):
+    try:
+        if "--migrate" in args:
+            await migrate_chats_info()
+        if "--trim" in args:
+            print(f"🧹 Trimmed {await trim_old_chats()} rows")
+    finally:
+        await database.dispose()
+
+
+if __name__ == "__main__":
+    # python chat_maintenance.py --migrate --trim
+    asyncio.run(main(sys.argv[1:]))
@@ -0,0 +1,211 @@
+import os
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError, TimeoutError as PoolTimeout
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential, before_sleep_log
+import database
+from models import Chat
+from conversation_cache import conversation_cache, history_key
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "true").lower() == "true"   # false = insert before responding
+CHAT_WRITE_BATCH = int(os.getenv("CHAT_WRITE_BATCH", "50"))              # rows per INSERT
+CHAT_WRITE_INTERVAL_MS = float(os.getenv("CHAT_WRITE_INTERVAL_MS", "250"))   # max time a row waits
+CHAT_WRITE_BUFFER = int(os.getenv("CHAT_WRITE_BUFFER", "5000"))          # queued rows before put() waits
+CHAT_WRITE_PUT_TIMEOUT = float(os.getenv("CHAT_WRITE_PUT_TIMEOUT", "5"))  # seconds to wait for space, then drop
+CHAT_WRITE_RETRIES = int(os.getenv("CHAT_WRITE_RETRIES", "5"))
+RECENTLY_WRITTEN = 256   # flushed rows still overlaid, for reads whose query ran before the commit
+
+
+def is_transient(error):
+    if isinstance(error, DBAPIError) and error.connection_invalidated:
+        return True
+    return isinstance(error, (OperationalError, InterfaceError, PoolTimeout, ConnectionError, asyncio.TimeoutError))
+
+
+def row_values(chat):
+    return {column.name: getattr(chat, column.name) for column in Chat.__table__.columns if column.name != "id"}
+
+
+def turn_key(chat):
+    return (chat.session_id, chat.created_at, chat.question)
+
+
+class ChatWriter:
+    """
+    Write-behind queue for Chat rows. Handlers put() a row and return; a background
+    task inserts queued rows in bulk every CHAT_WRITE_INTERVAL_MS or as soon as
+    CHAT_WRITE_BATCH are waiting. Rows stay queued (and visible through overlay())
+    until their INSERT commits, so history reads see a turn immediately.
+    """
+
+    def __init__(self, batch_size=CHAT_WRITE_BATCH, interval_ms=CHAT_WRITE_INTERVAL_MS,
+                 max_buffer=CHAT_WRITE_BUFFER, write_behind=CHAT_WRITE_BEHIND):
+        self.batch_size = batch_size
+        self.interval = interval_ms / 1000
+        self.max_buffer = max_buffer
+        self.write_behind = write_behind
+        self._buffer = deque()
+        self._written = deque(maxlen=RECENTLY_WRITTEN)
+        self._full = asyncio.Event()
+        self._space = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = None
+        self.flushes = 0
+        self.written = 0
+        self.dropped = 0
+
+    def start(self):
+        if self.write_behind and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(f"📝 Chat writer started (batch {self.batch_size}, {self.interval * 1000:.0f} ms)")
+
+    async def stop(self):
+        """Stop the background task and flush everything still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._buffer:
+            if not await self.flush():
+                logger.error(f"❌ Chat writer stopped with {len(self._buffer)} unsaved rows")
+                break
+
+    async def put(self, chat):
+        """Queue one Chat row; returns False if it had to be dropped"""
+        if chat.created_at is None:
+            chat.created_at = datetime.utcnow()   # fixes the overlay order now, not at flush time
+        if not self.write_behind or self._task is None:
+            await self._insert([chat])
+            await conversation_cache.append(chat)
+            return True
+
+        if len(self._buffer) >= self.max_buffer:
+            self._full.set()
+            try:
+                await asyncio.wait_for(self._wait_for_space(), CHAT_WRITE_PUT_TIMEOUT)
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                logger.error(f"❌ Chat write buffer full, dropping turn for session {chat.session_id}")
+                return False
+
+        self._buffer.append(chat)
+        if len(self._buffer) >= self.batch_size:
+            self._full.set()
+        await conversation_cache.append(chat)
+        return True
+
+    async def _wait_for_space(self):
+        while len(self._buffer) >= self.max_buffer:
+            self._space.clear()
+            await self._space.wait()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            while self._buffer:
+                if not await self.flush() or len(self._buffer) < self.batch_size:
+                    break
+
+    async def flush(self):
+        """INSERT the oldest batch; rows leave the queue only once committed"""
+        async with self._lock:
+            batch = list(islice(self._buffer, self.batch_size))
+            if not batch:
+                return True
+            saved = len(batch)
+            try:
+                await self._insert_with_retries(batch)
+            except Exception as e:
+                if is_transient(e):
+                    logger.error(f"❌ Chat flush failed, keeping {len(batch)} rows queued: {e}")
+                    return False
+                # A bad row must not wedge the queue: insert one by one, drop what still fails
+                saved = await self._insert_each(batch)
+
+            for _ in batch:
+                self._written.append(self._buffer.popleft())
+            for chat in batch:
+                if chat.id is not None:
+                    await conversation_cache.update(chat)   # cached at put() time, before it had an id
+            self.flushes += 1
+            self.written += saved
+            self._space.set()
+            return True
+
+    async def _insert_with_retries(self, chats):
+        async for attempt in AsyncRetrying(
+            retry=retry_if_exception(is_transient),
+            stop=stop_after_attempt(CHAT_WRITE_RETRIES),
+            wait=wait_exponential(multiplier=0.2, max=5),
+            before_sleep=before_sleep_log(logger, logging.WARNING),
+            reraise=True,
+        ):
+            with attempt:
+                await self._insert(chats)
+
+    async def _insert_each(self, chats):
+        saved = 0
+        for chat in chats:
+            try:
+                await self._insert([chat])
+                saved += 1
+            except Exception as e:
+                self.dropped += 1
+                logger.error(f"❌ Dropping chat row for session {chat.session_id}: {e}")
+        return saved
+
+    async def _insert(self, chats):
+        """Bulk INSERT ... RETURNING id; ids are set on the rows only once committed"""
+        async with database.AsyncSessionLocal() as session:
+            result = await session.execute(
+                insert(Chat).returning(Chat.id, sort_by_parameter_order=True),
+                [row_values(chat) for chat in chats],
+            )
+            ids = result.scalars().all()
+            await session.commit()
+        for chat, chat_id in zip(chats, ids):
+            chat.id = chat_id
+
+    def pending(self, session_id):
+        return [chat for queue in (self._written, self._buffer) for chat in queue if chat.session_id == session_id]
+
+    def overlay(self, rows, session_id, limit, newest_first=True, after=None):
+        """
+        Merge queued (and just-flushed) turns of session_id into rows read from the
+        database (read-your-writes). Returns at most limit rows in the requested order;
+        after skips turns up to that history_key (a history page cursor).
+        """
+        pending = self.pending(session_id)
+        if after is not None:
+            pending = [chat for chat in pending if history_key(chat) > after]
+        if not pending:
+            return list(rows)
+        seen = {turn_key(row) for row in rows}
+        merged = list(rows) + [chat for chat in pending if turn_key(chat) not in seen]
+        merged.sort(key=history_key, reverse=newest_first)
+        return merged[:limit]
+
+    def stats(self):
+        return {
+            "queued": len(self._buffer),
+            "flushes": self.flushes,
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+
+chat_writer = ChatWriter()
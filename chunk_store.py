@@ -0,0 +1,185 @@
+import os
+import re
+import json
+import mmap
+from collections.abc import Mapping
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+from ingest_manifest import content_hash
+
+# On-disk layout (all readable with mmap, so workers on a host share one page-cache copy):
+#   chunks.bin          every chunk text in one UTF-8 blob
+#   chunks_offsets.npy  int64, n + 1 entries; chunk i = blob[offsets[i]:offsets[i + 1]]
+#   chunks_source.npy   int32 per chunk, row in sources.json (-1 = unknown)
+#   chunks_ordinal.npy  int32 per chunk, position of the chunk within its page
+#   sources.json        column-wise page table: {"url": [...], "title": [...]}
+TEXT_FILE = "chunks.bin"
+OFFSETS_FILE = "chunks_offsets.npy"
+SOURCE_FILE = "chunks_source.npy"
+ORDINAL_FILE = "chunks_ordinal.npy"
+SOURCES_FILE = "sources.json"
+CHUNK_FILES = [TEXT_FILE, OFFSETS_FILE, SOURCE_FILE, ORDINAL_FILE, SOURCES_FILE]
+
+
+class ChunkStoreWriter:
+    """
+    Streams chunks into a new store: text goes straight to disk, only the small
+    per-chunk columns stay in memory. Files are written as *.tmp and renamed on
+    close(), so a ChunkStore already open on the same folder is never disturbed.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._text = open(self._tmp(TEXT_FILE), "wb")
+        self._offsets = [0]
+        self._source = []
+        self._ordinal = []
+        self._source_rows = {}
+        self._sources = {"url": [], "title": []}
+
+    def _tmp(self, name):
+        return os.path.join(self.folder, f"{name}.tmp")
+
+    def __len__(self):
+        return len(self._source)
+
+    def add(self, text, meta=None):
+        meta = meta or {}
+        data = text.encode("utf-8")
+        self._text.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+
+        # Dictionary-encode the page columns: many chunks share one url/title
+        url = meta.get("url") or meta.get("source")
+        row = -1
+        if url:
+            if url not in self._source_rows:
+                self._source_rows[url] = len(self._sources["url"])
+                self._sources["url"].append(url)
+                self._sources["title"].append(meta.get("title", ""))
+            row = self._source_rows[url]
+        self._source.append(row)
+        self._ordinal.append(meta.get("ordinal", 0))
+
+    def close(self):
+        self._text.close()
+        # np.save appends .npy to names that lack it, so write through file handles
+        for name, column in (
+            (OFFSETS_FILE, np.asarray(self._offsets, dtype=np.int64)),
+            (SOURCE_FILE, np.asarray(self._source, dtype=np.int32)),
+            (ORDINAL_FILE, np.asarray(self._ordinal, dtype=np.int32)),
+        ):
+            with open(self._tmp(name), "wb") as f:
+                np.save(f, column)
+        with open(self._tmp(SOURCES_FILE), "w", encoding="utf-8") as f:
+            json.dump(self._sources, f, ensure_ascii=False)
+
+        for name in CHUNK_FILES:
+            os.replace(self._tmp(name), os.path.join(self.folder, name))
+
+    def abort(self):
+        """Discard the partially written store"""
+        self._text.close()
+        for name in CHUNK_FILES:
+            if os.path.exists(self._tmp(name)):
+                os.remove(self._tmp(name))
+
+
+def write_chunk_store(folder, texts, metadatas=None):
+    """Write chunk texts and their url/title/ordinal metadata column-wise"""
+    writer = ChunkStoreWriter(folder)
+    for text, meta in zip(texts, metadatas or [{} for _ in texts]):
+        writer.add(text, meta)
+    writer.close()
+
+
+def has_chunk_store(folder):
+    return all(os.path.exists(os.path.join(folder, name)) for name in CHUNK_FILES)
+
+
+class ChunkStore(Docstore):
+    """
+    Read-only, mmap-backed docstore; ids are the chunk positions as strings.
+    Document objects are only built for the ids actually looked up.
+    """
+
+    def __init__(self, folder):
+        self._offsets = np.load(os.path.join(folder, OFFSETS_FILE), mmap_mode="r")
+        self._source = np.load(os.path.join(folder, SOURCE_FILE), mmap_mode="r")
+        self._ordinal = np.load(os.path.join(folder, ORDINAL_FILE), mmap_mode="r")
+        with open(os.path.join(folder, SOURCES_FILE), "r", encoding="utf-8") as f:
+            self._sources = json.load(f)
+        with open(os.path.join(folder, TEXT_FILE), "rb") as f:
+            # mmap keeps its own reference to the file, so the handle can close
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self._offsets[-1] else b""
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def text(self, i):
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return self._blob[start:end].decode("utf-8")
+
+    def metadata(self, i):
+        row = int(self._source[i])
+        meta = {"ordinal": int(self._ordinal[i])}
+        if row >= 0:
+            meta["url"] = self._sources["url"][row]
+            meta["title"] = self._sources["title"][row]
+        return meta
+
+    def rows_for(self, urls):
+        """Chunk rows whose source url is one of urls, ascending"""
+        urls = set(urls)
+        wanted = [row for row, url in enumerate(self._sources["url"]) if url in urls]
+        return np.flatnonzero(np.isin(self._source, wanted))
+
+    def search(self, search):
+        i = int(search)
+        if not 0 <= i < len(self):
+            return f"ID {search} not found."
+        text = self.text(i)
+        # The hash is derived from the text, not stored
+        return Document(page_content=text, metadata={**self.metadata(i), "hash": content_hash(text)})
+
+
+class PositionalIds(Mapping):
+    """index_to_docstore_id for a ChunkStore without materializing a dict"""
+
+    def __init__(self, n):
+        self._n = n
+
+    def __getitem__(self, i):
+        if not 0 <= i < self._n:
+            raise KeyError(i)
+        return str(i)
+
+    def __iter__(self):
+        return iter(range(self._n))
+
+    def __len__(self):
+        return self._n
+
+
+PAGE_MARKER = re.compile(r"(?:--- PAGE: (?P<page>\S+) ---|SOURCE: (?P<source>\S+)(?:\nTITLE: (?P<title>[^\n]*))?)")
+
+
+def infer_page_metadata(chunks):
+    """
+    Recover url/title/ordinal for chunks split from one joined text.
+    A chunk without a page marker belongs to the most recent page seen before it.
+    """
+    metadatas = []
+    current = {}
+    ordinal = 0
+    for chunk in chunks:
+        match = None
+        for match in PAGE_MARKER.finditer(chunk):
+            pass
+        if match:
+            current = {"url": match.group("page") or match.group("source"), "title": match.group("title") or ""}
+            ordinal = 0
+        metadatas.append({**current, "ordinal": ordinal})
+        ordinal += 1
+    return metadatas
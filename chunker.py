@@ -0,0 +1,64 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from ingest_manifest import content_hash
+
+# Configuration (shared by rag_ingest and create_vectorstore)
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "500"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50"))
+CHUNK_PROCESSES = int(os.getenv("CHUNK_PROCESSES", "0"))   # >1 = split pages in a process pool
+SEPARATORS = ["\n\n", "\n", ". ", " ", ""]
+
+_splitter = None
+
+
+def get_splitter():
+    """Per-process splitter (pool workers build their own)"""
+    global _splitter
+    if _splitter is None:
+        _splitter = RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            separators=SEPARATORS
+        )
+    return _splitter
+
+
+def page_text(url, content):
+    """Page text as it is chunked; the marker keeps the url visible to the embedding"""
+    return f"--- PAGE: {url} ---\n\n{content}"
+
+
+def chunk_page(url, title, content):
+    """Split one page on its own; every chunk carries url, title, ordinal and content hash"""
+    docs = get_splitter().create_documents(
+        [page_text(url, content)],
+        metadatas=[{"url": url, "title": title or ""}]
+    )
+    for ordinal, doc in enumerate(docs):
+        doc.metadata["ordinal"] = ordinal
+        doc.metadata["hash"] = content_hash(doc.page_content)
+    return docs
+
+
+def chunk_pool(processes=CHUNK_PROCESSES):
+    """Process pool for chunk_page, or None to split in-process"""
+    if processes <= 1:
+        return None
+    # spawn: the ingest scripts also hold torch threads, which fork can deadlock
+    return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+
+
+def chunk_pages(pages, processes=CHUNK_PROCESSES):
+    """Chunk page dicts (url, title, content) in page order; returns one flat Document list"""
+    pages = [page for page in pages if page.get("content")]
+    args = ([p["url"] for p in pages], [p.get("title", "") for p in pages], [p["content"] for p in pages])
+
+    pool = chunk_pool(processes)
+    if pool is None:
+        per_page = map(chunk_page, *args)
+    else:
+        with pool:
+            per_page = list(pool.map(chunk_page, *args, chunksize=8))
+    return [doc for docs in per_page for doc in docs]
@@ -0,0 +1,142 @@
+import os
+import re
+import logging
+import numpy as np
+import xxhash
+from chunk_store import PAGE_MARKER
+from reranker import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))   # estimated Jaccard to drop a segment
+MAX_OVERLAP = 200          # chars searched when stitching adjacent chunks (splitter overlap is 50)
+MIN_OVERLAP = 10
+SHINGLE_WORDS = 5
+NUM_PERM = 64
+MIN_BOILERPLATE_CHARS = 40   # shorter repeated sentences ("Read more.") are kept
+
+SEPARATOR = "\n\n---\n\n"
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+PAGE_SEPARATOR = re.compile(r"^\s*---\s*$", re.MULTILINE)
+
+# Fixed hash family so signatures are comparable across requests
+_rng = np.random.default_rng(0x5EED)
+_MASKS = _rng.integers(0, 2**63, size=NUM_PERM, dtype=np.uint64)
+_MULTS = _rng.integers(0, 2**63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+
+
+def strip_markers(text):
+    """Drop page headers ("--- PAGE: url ---", "SOURCE:/TITLE:") and bare --- separators"""
+    text = PAGE_MARKER.sub("", text)
+    return PAGE_SEPARATOR.sub("", text).strip()
+
+
+def stitch(left, right):
+    """Join two consecutive chunks, dropping the text the splitter repeated at the seam"""
+    for size in range(min(MAX_OVERLAP, len(left), len(right)), MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return f"{left} {right}"
+
+
+def minhash(text):
+    """MinHash signature over word shingles (uint64 wrap-around multiply-xor hash family)"""
+    words = text.lower().split()
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+    hashes = np.fromiter((xxhash.xxh64_intdigest(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((hashes[None, :] ^ _MASKS[:, None]) * _MULTS[:, None]).min(axis=1)
+
+
+def similarity(a, b):
+    return float(np.mean(a == b))
+
+
+def merge_segments(docs):
+    """
+    Group hits by source page and stitch runs of consecutive ordinals.
+    Returns segments (url, text) ordered by the best retrieval rank inside each.
+    """
+    groups = {}
+    for rank, doc in enumerate(docs):
+        url = doc.metadata.get("url")
+        key = url if url is not None else ("rank", rank)
+        groups.setdefault(key, []).append((doc.metadata.get("ordinal", 0), rank, strip_markers(doc.page_content)))
+
+    segments = []
+    for key, hits in groups.items():
+        url = key if isinstance(key, str) else None
+        hits.sort()
+        run_ordinal, run_rank, run_text = hits[0]
+        for ordinal, rank, text in hits[1:]:
+            if ordinal == run_ordinal:
+                continue
+            if ordinal == run_ordinal + 1:
+                run_ordinal, run_rank, run_text = ordinal, min(run_rank, rank), stitch(run_text, text)
+            else:
+                segments.append((run_rank, url, run_text))
+                run_ordinal, run_rank, run_text = ordinal, rank, text
+        segments.append((run_rank, url, run_text))
+
+    segments.sort(key=lambda segment: segment[0])
+    return [(url, text) for _, url, text in segments]
+
+
+def drop_repeated_sentences(text, seen):
+    """Remove long sentences already sent in an earlier segment (shared page blurbs)"""
+    kept = []
+    for sentence in SENTENCE_END.split(text):
+        normalized = " ".join(sentence.lower().split())
+        if len(normalized) >= MIN_BOILERPLATE_CHARS:
+            if normalized in seen:
+                continue
+            seen.add(normalized)
+        kept.append(sentence)
+    return " ".join(kept).strip()
+
+
+def truncate_to_tokens(text, budget):
+    """Cut at the last sentence end that fits, else hard-cut"""
+    limit = max(0, (budget - 1) * 4)
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    end = max(cut.rfind(". "), cut.rfind("! "), cut.rfind("? "))
+    return cut[:end + 1] if end > 0 else cut
+
+
+def pack_context(docs, token_budget=CONTEXT_TOKEN_BUDGET, threshold=DEDUP_THRESHOLD):
+    """Merged, de-duplicated context string that fits token_budget"""
+    parts = []
+    signatures = []
+    seen_sentences = set()
+    used = 0
+    dropped = 0
+
+    for url, text in merge_segments(docs):
+        text = drop_repeated_sentences(text, seen_sentences)
+        if not text:
+            dropped += 1
+            continue
+
+        signature = minhash(text)
+        if any(similarity(signature, other) >= threshold for other in signatures):
+            dropped += 1
+            continue
+
+        block = f"Source: {url}\n{text}" if url else text
+        tokens = estimate_tokens(block)
+        if used + tokens > token_budget:
+            if parts:
+                dropped += 1
+                continue
+            block = truncate_to_tokens(block, token_budget)
+            tokens = estimate_tokens(block)
+
+        parts.append(block)
+        signatures.append(signature)
+        used += tokens
+
+    logger.info(f"🧩 Packed {len(docs)} chunks into {len(parts)} segments (~{used} tokens, {dropped} dropped)")
+    return SEPARATOR.join(parts)
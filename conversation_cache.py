@@ -0,0 +1,297 @@
+import os
+import sys
+import json
+import logging
+import multiprocessing
+from collections import deque, namedtuple
+from datetime import datetime
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+CONVERSATION_CACHE = os.getenv("CONVERSATION_CACHE", "auto").lower()   # auto | local | redis | off
+CONVERSATION_WINDOW = int(os.getenv("CONVERSATION_WINDOW", "20"))      # turns kept per session
+CONVERSATION_CACHE_SESSIONS = int(os.getenv("CONVERSATION_CACHE_SESSIONS", "10000"))
+CONVERSATION_CACHE_TTL = int(os.getenv("CONVERSATION_CACHE_TTL", "1800"))   # seconds idle before a session expires
+CONVERSATION_REDIS_URL = os.getenv("CONVERSATION_REDIS_URL")
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))   # set by some platforms; not by uvicorn --workers / gunicorn -w
+
+# What the cache keeps of a Chat row (enough for rewrite prompts and /chat/history)
+Turn = namedtuple("Turn", ["id", "session_id", "question", "answer", "created_at"])
+
+
+def as_turn(chat):
+    return Turn(chat.id, chat.session_id, chat.question, chat.answer, chat.created_at)
+
+
+def same_turn(a, b):
+    return a.created_at == b.created_at and a.question == b.question
+
+
+def history_key(chat):
+    """Order and cursor key of /chat/history pages; turns still queued have no id yet"""
+    return (chat.created_at, chat.id or 0)
+
+
+class LocalWindows:
+    """Per-process LRU of session ring buffers; idle sessions expire after ttl"""
+
+    name = "local"
+
+    def __init__(self, window, max_sessions=CONVERSATION_CACHE_SESSIONS, ttl=CONVERSATION_CACHE_TTL):
+        self.window = window
+        self._sessions = TTLCache(maxsize=max_sessions, ttl=ttl)
+
+    async def get(self, session_id):
+        entry = self._sessions.get(session_id)
+        if entry is not None:
+            self._sessions[session_id] = entry   # re-set: refreshes both LRU position and TTL
+        return entry
+
+    async def fill(self, session_id, turns, truncated):
+        self._sessions[session_id] = (deque(turns, maxlen=self.window), [truncated])
+
+    async def append(self, turn):
+        entry = self._sessions.get(turn.session_id)
+        if entry is None:
+            return   # unknown history: the next read fills from the database
+        turns, truncated = entry
+        if len(turns) == self.window:
+            truncated[0] = True
+        turns.append(turn)
+        self._sessions[turn.session_id] = entry
+
+    async def update(self, turn):
+        entry = self._sessions.get(turn.session_id)
+        if entry is None:
+            return
+        turns = entry[0]
+        for i, cached in enumerate(turns):
+            if cached.id is None and same_turn(cached, turn):
+                turns[i] = turn
+                return
+
+    def size(self):
+        return len(self._sessions)
+
+
+# KEYS: list, meta. ARGV: turn json, window, ttl. Appends only to sessions already filled.
+APPEND_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then return 0 end
+redis.call('RPUSH', KEYS[1], ARGV[1])
+if redis.call('LLEN', KEYS[1]) > tonumber(ARGV[2]) then
+    redis.call('LTRIM', KEYS[1], -tonumber(ARGV[2]), -1)
+    redis.call('SET', KEYS[2], '1')
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return 1
+"""
+
+# KEYS: list. ARGV: turn json. Replaces the id-less copy of the turn appended before its INSERT.
+UPDATE_SCRIPT = """
+local turn = cjson.decode(ARGV[1])
+local turns = redis.call('LRANGE', KEYS[1], 0, -1)
+for i, raw in ipairs(turns) do
+    local cached = cjson.decode(raw)
+    if cached.id == cjson.null and cached.created_at == turn.created_at and cached.question == turn.question then
+        redis.call('LSET', KEYS[1], i - 1, ARGV[1])
+        return 1
+    end
+end
+return 0
+"""
+
+
+class RedisWindows:
+    """
+    Session windows shared by every worker, in Redis (or anything speaking its
+    protocol). conv:<session> holds the turns as JSON, conv:<session>:meta the
+    truncated flag; both expire after ttl idle seconds.
+    """
+
+    name = "redis"
+
+    def __init__(self, url, window, ttl=CONVERSATION_CACHE_TTL):
+        import redis.asyncio as redis   # optional dependency, not in requirements.txt
+
+        self.client = redis.from_url(url)
+        self.window = window
+        self.ttl = ttl
+        self._append = self.client.register_script(APPEND_SCRIPT)
+        self._update = self.client.register_script(UPDATE_SCRIPT)
+
+    @staticmethod
+    def keys(session_id):
+        return f"conv:{session_id}", f"conv:{session_id}:meta"
+
+    @staticmethod
+    def dumps(turn):
+        return json.dumps({**turn._asdict(), "created_at": turn.created_at.isoformat() if turn.created_at else None})
+
+    @staticmethod
+    def loads(raw):
+        data = json.loads(raw)
+        created_at = datetime.fromisoformat(data["created_at"]) if data["created_at"] else None
+        return Turn(**{**data, "created_at": created_at})
+
+    async def get(self, session_id):
+        turns_key, meta_key = self.keys(session_id)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.get(meta_key).lrange(turns_key, 0, -1).expire(turns_key, self.ttl).expire(meta_key, self.ttl)
+            meta, raw_turns, *_ = await pipe.execute()
+        if meta is None:
+            return None
+        return deque(map(self.loads, raw_turns), maxlen=self.window), [meta == b"1"]
+
+    async def fill(self, session_id, turns, truncated):
+        turns_key, meta_key = self.keys(session_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(turns_key)
+            if turns:
+                pipe.rpush(turns_key, *map(self.dumps, list(turns)[-self.window:])).expire(turns_key, self.ttl)
+            pipe.set(meta_key, "1" if truncated else "0", ex=self.ttl)
+            await pipe.execute()
+
+    async def append(self, turn):
+        await self._append(keys=self.keys(turn.session_id), args=[self.dumps(turn), self.window, self.ttl])
+
+    async def update(self, turn):
+        await self._update(keys=self.keys(turn.session_id)[:1], args=[self.dumps(turn)])
+
+    def size(self):
+        return None
+
+
+def single_process():
+    """
+    False when this process may be one of several server workers: uvicorn
+    --workers (and --reload) start workers through multiprocessing, gunicorn forks
+    them from its arbiter. Errs on the side of "several".
+    """
+    if WEB_CONCURRENCY > 1 or multiprocessing.parent_process() is not None:
+        return False
+    return "gunicorn" not in os.path.basename(sys.argv[0])
+
+
+def make_backend(mode=CONVERSATION_CACHE, window=CONVERSATION_WINDOW):
+    """
+    auto: Redis when CONVERSATION_REDIS_URL is set, a local cache in a single
+    server process, else nothing. Per-worker caches would miss turns written by
+    other workers, so those read the database instead.
+    """
+    if mode == "auto":
+        mode = "redis" if CONVERSATION_REDIS_URL else "local" if single_process() else "off"
+    if mode == "redis":
+        try:
+            return RedisWindows(CONVERSATION_REDIS_URL, window)
+        except Exception as e:
+            logger.warning(f"⚠️ Redis conversation cache unavailable ({e}), reading history from the database")
+            return None
+    if mode == "local":
+        return LocalWindows(window)
+    return None
+
+
+class ConversationCache:
+    """
+    Last CONVERSATION_WINDOW turns per session, filled on the first read and on every
+    write. A session whose older turns fell out of the window is marked truncated and
+    only serves "recent N" reads; full history reads need an untruncated window.
+    Backend errors count as misses, so the database stays the fallback.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.window = backend.window if backend else 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    async def _get(self, session_id):
+        try:
+            return await self.backend.get(session_id)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"⚠️ Conversation cache read failed: {e}")
+            return None
+
+    def _count(self, turns):
+        if turns is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return turns
+
+    async def recent(self, session_id, limit):
+        """Last limit turns, oldest first, or None on a miss"""
+        if not self.enabled or limit > self.window:
+            return None
+        entry = await self._get(session_id)
+        if entry is None:
+            return self._count(None)
+        turns, (truncated,) = entry
+        if len(turns) < limit and truncated:
+            return self._count(None)
+        return self._count(list(turns)[-limit:] if limit else [])
+
+    async def history(self, session_id, since, limit, after=None):
+        """
+        Turns created at or after since (and past the history_key after), oldest
+        first, or None unless the whole session is cached
+        """
+        if not self.enabled:
+            return None
+        entry = await self._get(session_id)
+        if entry is None or entry[1][0]:
+            return self._count(None)
+        turns = [
+            turn for turn in entry[0]
+            if turn.created_at and turn.created_at >= since and (after is None or history_key(turn) > after)
+        ]
+        return self._count(turns[:limit])
+
+    async def _write(self, method, *args):
+        try:
+            await getattr(self.backend, method)(*args)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"⚠️ Conversation cache {method} failed: {e}")
+
+    async def fill(self, session_id, chats, truncated):
+        """Cache a window read from the database (chats oldest first)"""
+        if self.enabled:
+            await self._write("fill", session_id, [as_turn(chat) for chat in chats], truncated)
+
+    async def start(self, session_id):
+        """A brand-new session: its (empty) history is known to be complete"""
+        if self.enabled:
+            await self._write("fill", session_id, [], False)
+
+    async def append(self, chat):
+        if self.enabled:
+            await self._write("append", as_turn(chat))
+
+    async def update(self, chat):
+        """A turn appended while queued has been inserted: give the cached copy its id"""
+        if self.enabled:
+            await self._write("update", as_turn(chat))
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "backend": self.backend.name if self.backend else "off",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "errors": self.errors,
+            "sessions": self.backend.size() if self.backend else 0,
+        }
+
+
+conversation_cache = ConversationCache(make_backend())
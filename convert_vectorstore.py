@@ -0,0 +1,38 @@
+import os
+import sys
+import pickle
+import shutil
+from chunk_store import write_chunk_store, infer_page_metadata
+from sparse_index import write_sparse_index
+
+
+def convert_vectorstore(src="vectorstore_old", dst="vectorstore"):
+    """Convert a pickled LangChain FAISS store (index.faiss + index.pkl) to the chunk store format"""
+
+    # 1. Load the pickled docstore once (trusted, locally built file)
+    print(f"📖 Loading {src}/index.pkl...")
+    with open(os.path.join(src, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    # 2. Read chunks in FAISS row order so positions match the index
+    docs = [docstore.search(index_to_docstore_id[i]) for i in range(len(index_to_docstore_id))]
+    texts = [doc.page_content for doc in docs]
+    print(f"✅ Loaded {len(texts)} chunks")
+
+    # 3. Keep existing metadata, otherwise recover url/ordinal from page markers
+    metadatas = [doc.metadata for doc in docs]
+    if not any(metadatas):
+        metadatas = infer_page_metadata(texts)
+
+    # 4. Write the new store next to an unchanged copy of index.faiss
+    os.makedirs(dst, exist_ok=True)
+    shutil.copyfile(os.path.join(src, "index.faiss"), os.path.join(dst, "index.faiss"))
+    write_chunk_store(dst, texts, metadatas)
+    write_sparse_index(dst, texts)
+
+    sources = {m.get("url") for m in metadatas if m.get("url")}
+    print(f"✅ Wrote chunk store to {dst}/ ({len(sources)} source pages)")
+
+
+if __name__ == "__main__":
+    convert_vectorstore(*sys.argv[1:3])
@@ -0,0 +1,218 @@
+import os
+import asyncio
+import logging
+from urllib.parse import urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+import httpx
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+USER_AGENT = os.getenv(
+    "CRAWLER_USER_AGENT",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+)
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "4"))     # in-flight requests per host
+CRAWL_DELAY = float(os.getenv("CRAWL_DELAY", "0.25"))           # min seconds between request starts per host
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "5"))
+CRAWL_TIMEOUT = float(os.getenv("CRAWL_TIMEOUT", "10"))
+
+STRIP_TAGS = ["script", "style", "noscript", "header", "footer", "nav"]
+
+
+def is_valid_url(url, base_domain):
+    """Check if URL belongs to the same domain"""
+    parsed = urlparse(url)
+    base_parsed = urlparse(base_domain)
+    return parsed.scheme in ("http", "https") and parsed.netloc == base_parsed.netloc
+
+
+def parse_page(html, url, base_url):
+    """Single parse for both the cleaned text and the internal links of a page"""
+    soup = BeautifulSoup(html, "html.parser")
+
+    links = set()
+    for link in soup.find_all('a', href=True):
+        full_url = urljoin(url, link['href'])
+        full_url = full_url.split('#')[0].split('?')[0]
+
+        if is_valid_url(full_url, base_url):
+            links.add(full_url)
+
+    title = soup.title.get_text(strip=True) if soup.title else ""
+
+    # Remove unwanted tags
+    for tag in soup(STRIP_TAGS):
+        tag.decompose()
+
+    return soup.get_text(separator=" ", strip=True), title, sorted(links)
+
+
+class HostLimiter:
+    """Per-host concurrency cap plus a minimum interval between request starts"""
+
+    def __init__(self, concurrency, delay):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._lock = asyncio.Lock()
+        self._next_start = 0.0
+        self.delay = delay
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            start = max(now, self._next_start)
+            self._next_start = start + self.delay
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def __aexit__(self, *exc):
+        self._semaphore.release()
+
+
+class Crawler:
+    """
+    Polite async BFS crawler.
+    Levels are visited in sorted order, so the same site yields the same page set.
+    known_pages (ingest manifest entries by url) turns fetches into conditional GETs.
+    """
+
+    def __init__(
+        self,
+        start_url,
+        max_pages,
+        max_depth=CRAWL_MAX_DEPTH,
+        known_pages=None,
+        concurrency=CRAWL_CONCURRENCY,
+        delay=CRAWL_DELAY,
+        timeout=CRAWL_TIMEOUT,
+        transport=None
+    ):
+        self.start_url = start_url
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.known_pages = known_pages or {}
+        self.concurrency = concurrency
+        self.delay = delay
+        self.timeout = timeout
+        self.transport = transport   # e.g. httpx.MockTransport in tests
+        self._limiters = {}
+        self._robots = {}
+
+    def _limiter(self, url):
+        host = urlparse(url).netloc
+        if host not in self._limiters:
+            delay = self.delay
+            robots = self._robots.get(host)
+            crawl_delay = robots.crawl_delay(USER_AGENT) if robots else None
+            if crawl_delay:
+                delay = max(delay, float(crawl_delay))
+            self._limiters[host] = HostLimiter(self.concurrency, delay)
+        return self._limiters[host]
+
+    async def _load_robots(self, client, url):
+        parsed = urlparse(url)
+        robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
+        parser = RobotFileParser(robots_url)
+        try:
+            r = await client.get(robots_url)
+            if r.status_code in (401, 403):
+                parser.disallow_all = True
+            elif r.status_code >= 400:
+                parser.allow_all = True
+            else:
+                parser.parse(r.text.splitlines())
+        except httpx.HTTPError as e:
+            logger.warning(f"⚠️ robots.txt unavailable for {parsed.netloc}: {e}")
+            parser.allow_all = True
+        self._robots[parsed.netloc] = parser
+
+    def _allowed(self, url):
+        robots = self._robots.get(urlparse(url).netloc)
+        return robots is None or robots.can_fetch(USER_AGENT, url)
+
+    async def fetch(self, client, url):
+        """Fetch one page; returns a page dict with status ok/not_modified/gone/error"""
+        known = self.known_pages.get(url, {})
+        headers = {}
+        if known.get("etag"):
+            headers["If-None-Match"] = known["etag"]
+        if known.get("last_modified"):
+            headers["If-Modified-Since"] = known["last_modified"]
+
+        try:
+            async with self._limiter(url):
+                r = await client.get(url, headers=headers)
+
+            if r.status_code == 304:
+                return {"url": url, "status": "not_modified", "links": known.get("links", [])}
+            if r.status_code in (404, 410):
+                return {"url": url, "status": "gone"}
+            r.raise_for_status()
+
+            # Parse off the event loop; BeautifulSoup is CPU-bound
+            text, title, links = await asyncio.to_thread(parse_page, r.text, url, self.start_url)
+            return {
+                "url": url,
+                "status": "ok",
+                "content": text,
+                "title": title,
+                "links": links,
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+            }
+        except Exception as e:
+            logger.error(f"❌ Error fetching {url}: {e}")
+            return {"url": url, "status": "error"}
+
+    async def _fetch_and_emit(self, client, url, depth, on_page):
+        page = await self.fetch(client, url)
+        page["depth"] = depth
+        if on_page is None:
+            return page
+        await on_page(page)
+        return {"url": url, "status": page["status"], "links": page.get("links", [])}
+
+    async def crawl(self, on_page=None):
+        """
+        Crawl and return the page dicts. With an async on_page callback each page
+        is handed over as soon as it is fetched (awaiting it applies backpressure)
+        and only its links are retained here.
+        """
+        limits = httpx.Limits(max_connections=self.concurrency * 2, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT},
+            timeout=self.timeout,
+            limits=limits,
+            follow_redirects=True,
+            transport=self.transport
+        ) as client:
+            await self._load_robots(client, self.start_url)
+
+            pages = []
+            seen = {self.start_url}
+            level = [self.start_url]
+
+            for depth in range(self.max_depth + 1):
+                level = sorted(url for url in level if self._allowed(url))
+                level = level[:self.max_pages - len(pages)]
+                if not level:
+                    break
+
+                logger.info(f"🔹 Depth {depth}: fetching {len(level)} pages ({len(pages)} done)")
+                results = await asyncio.gather(
+                    *(self._fetch_and_emit(client, url, depth, on_page) for url in level)
+                )
+
+                next_level = []
+                for page in results:
+                    for link in page.get("links", []):
+                        if link not in seen:
+                            seen.add(link)
+                            next_level.append(link)
+                pages.extend(results)
+                level = next_level
+
+            return pages
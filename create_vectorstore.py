@@ -1,8 +1,9 @@
 import json
 import os
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
+from embedding_engine import EmbeddingEngine
+from vector_index import INDEX_TYPE, build_vectorstore, save_vectorstore
+from chunk_store import TEXT_FILE
+from chunker import chunk_pages
 
 def create_vectorstore():
     """Create FAISS vector store from scraped data"""
@@ -14,28 +15,13 @@ def create_vectorstore():
     
     print(f"✅ Loaded {len(pages)} pages")
     
-    # 2. Combine all text
-    print("\n📝 Combining text from all pages...")
-    all_text = []
-    for page in pages:
-        page_text = f"SOURCE: {page['url']}\nTITLE: {page['title']}\n\n{page['content']}\n\n"
-        all_text.append(page_text)
-    
-    combined_text = "\n---\n".join(all_text)
-    print(f"✅ Combined text length: {len(combined_text):,} characters")
-    
-    # 3. Split into chunks
-    print("\n✂️  Splitting into chunks...")
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=500,
-        chunk_overlap=50,
-        separators=["\n\n", "\n", ". ", " ", ""]
-    )
-    
-    chunks = splitter.split_text(combined_text)
+    # 2. Split each page on its own so no chunk spans two pages
+    print("\n✂️  Splitting pages into chunks...")
+    docs = chunk_pages(pages)
+    chunks = [doc.page_content for doc in docs]
     print(f"✅ Created {len(chunks)} chunks")
     
-    # 4. Save chunks to readable file (for verification)
+    # 3. Save chunks to readable file (for verification)
     print("\n💾 Saving chunks to readable file...")
     os.makedirs('data', exist_ok=True)
     with open('data/chunks.json', 'w', encoding='utf-8') as f:
@@ -43,29 +29,33 @@ def create_vectorstore():
     
     print(f"✅ Chunks saved to: data/chunks.json (you can read this!)")
     
-    # 5. Create embeddings
+    # 4. Create embeddings
     print("\n🔧 Creating embeddings model...")
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
+    embeddings = EmbeddingEngine()
     print("✅ Embeddings model ready")
     
-    # 6. Create FAISS vector store
-    print("\n🧠 Creating FAISS vector store...")
-    vectorstore = FAISS.from_texts(chunks, embeddings)
+    # 5. Create FAISS vector store
+    print(f"\n🧠 Creating FAISS vector store ({INDEX_TYPE})...")
+    try:
+        vectorstore, index_params = build_vectorstore(
+            chunks, embeddings, INDEX_TYPE, metadatas=[doc.metadata for doc in docs]
+        )
+    finally:
+        embeddings.close()
+    if "report" in index_params:
+        print(f"📈 Recall vs flat baseline: {index_params['report']}")
     
-    # 7. Save vector store
+    # 6. Save vector store
     print("\n💾 Saving vector store...")
-    os.makedirs('vectorstore', exist_ok=True)
-    vectorstore.save_local('vectorstore')
+    save_vectorstore(vectorstore, 'vectorstore', index_params)
     
     # Check file sizes
     faiss_size = os.path.getsize('vectorstore/index.faiss')
-    pkl_size = os.path.getsize('vectorstore/index.pkl')
+    chunks_size = os.path.getsize(f'vectorstore/{TEXT_FILE}')
     
     print(f"\n✅ Vector store created successfully!")
     print(f"   📁 vectorstore/index.faiss: {faiss_size:,} bytes")
-    print(f"   📁 vectorstore/index.pkl: {pkl_size:,} bytes")
+    print(f"   📁 vectorstore/{TEXT_FILE}: {chunks_size:,} bytes")
     print(f"\n📊 Summary:")
     print(f"   - Pages scraped: {len(pages)}")
     print(f"   - Text chunks: {len(chunks)}")
@@ -1,6 +1,8 @@
 import os
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -10,32 +12,140 @@ load_dotenv()
 # Get DATABASE_URL
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-print(f"👉 DATABASE_URL = {DATABASE_URL}")
-print(f"👉 URL repr = {repr(DATABASE_URL)}")
-print(f"👉 '..' in URL? {'..' in DATABASE_URL}")
+# Pool configuration (per process; Postgres only, SQLite uses SQLAlchemy's defaults)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))        # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))        # seconds; stay under proxy idle timeouts
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "5000"))
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))    # seconds
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"   # transaction pooler: no prepared statement caches
+PGBOUNCER_PORT = 6543   # Supabase's transaction pooler
+
+# Async drivers for the sync URL schemes people put in DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+# libpq query parameters asyncpg doesn't understand: translated (sslmode -> ssl) or dropped
+LIBPQ_ONLY_PARAMS = {
+    "sslmode", "sslrootcert", "sslcert", "sslkey", "sslcrl", "sslpassword", "channel_binding",
+    "gssencmode", "connect_timeout", "options", "target_session_attrs", "application_name", "client_encoding",
+}
 
-# IMPORTANT: Do not modify the URL in any way
 # Create engine and other objects
 engine = None
 SessionLocal = None
+async_engine = None
+AsyncSessionLocal = None
 Base = declarative_base()
 
-try:
-    # Direct creation without modifications
-    engine = create_engine(DATABASE_URL)
-    
-    # Test the connection
-    with engine.connect() as connection:
-        print("✅ Database connected successfully!")
-    
+
+def redacted(url):
+    """DATABASE_URL safe for logs (password hidden)"""
+    return make_url(url).render_as_string(hide_password=True)
+
+
+def sync_url(url):
+    # SQLAlchemy dropped the "postgres://" alias that Supabase/Heroku hand out
+    return "postgresql://" + url[len("postgres://"):] if url.startswith("postgres://") else url
+
+
+def uses_pgbouncer(url):
+    """Transaction-mode poolers (pgbouncer, Supabase :6543) break cached prepared statements"""
+    return DB_PGBOUNCER or make_url(sync_url(url)).port == PGBOUNCER_PORT
+
+
+def async_url(url):
+    """
+    Same database, async driver (postgresql -> asyncpg, sqlite -> aiosqlite).
+    asyncpg gets every query parameter as a connect() argument, so libpq-only
+    ones are translated (sslmode -> ssl) or dropped.
+    """
+    parsed = make_url(sync_url(url))
+    parsed = parsed.set(drivername=ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername))
+    if parsed.get_driver_name() != "asyncpg":
+        return parsed
+
+    query = {key: value for key, value in parsed.query.items() if key not in LIBPQ_ONLY_PARAMS}
+    if "sslmode" in parsed.query and "ssl" not in query:
+        query["ssl"] = parsed.query["sslmode"]   # asyncpg takes the same mode names
+    if uses_pgbouncer(url):
+        query["prepared_statement_cache_size"] = "0"   # SQLAlchemy's cache
+    return parsed.set(query=query)
+
+
+def engine_options(url, is_async):
+    """Pool sizing, pre-ping and statement timeout for one engine"""
+    backend = make_url(sync_url(url)).get_backend_name()
+    options = {"pool_pre_ping": True}
+    if backend == "sqlite":
+        return options
+
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    if backend == "postgresql":
+        if is_async:
+            options["connect_args"] = {
+                "server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)},
+                "timeout": DB_CONNECT_TIMEOUT,
+            }
+            if uses_pgbouncer(url):
+                options["connect_args"]["statement_cache_size"] = 0   # asyncpg's own cache
+        else:
+            options["connect_args"] = {
+                "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}",
+                "connect_timeout": DB_CONNECT_TIMEOUT,
+            }
+    return options
+
+
+def configure(url):
+    """
+    Build the sync (scripts) and async (request handlers) engines.
+    Nothing connects here; pre-ping checks connections when they are checked out.
+    """
+    global engine, SessionLocal, async_engine, AsyncSessionLocal
+
+    url = sync_url(url)
+    engine = create_engine(url, **engine_options(url, is_async=False))
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    
-except Exception as e:
-    print(f"⚠️ Database connection failed: {e}")
-    import traceback
-    traceback.print_exc()
-    engine = None
-    SessionLocal = None
+
+    async_engine = create_async_engine(async_url(url), **engine_options(url, is_async=True))
+    # expire_on_commit=False: rows stay readable after commit without an implicit (sync) reload
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    print(f"✅ Database configured: {redacted(url)}")
+
+
+if DATABASE_URL:
+    try:
+        configure(DATABASE_URL)
+    except Exception as e:
+        print(f"⚠️ Database configuration failed: {e}")
+        engine = SessionLocal = async_engine = AsyncSessionLocal = None
+else:
+    print("⚠️ DATABASE_URL is not set; chat history is disabled")
+
+
+async def init_models():
+    """Create missing tables through the async engine"""
+    async with async_engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+
+async def dispose():
+    if async_engine is not None:
+        await async_engine.dispose()
+    if engine is not None:
+        engine.dispose()
+
 
 def get_db():
     if SessionLocal is None:
@@ -45,4 +155,13 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    """FastAPI dependency: one AsyncSession per request (None without a database)"""
+    if AsyncSessionLocal is None:
+        yield None
+        return
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,159 @@
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from micro_batcher import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")   # torch | torch-int8 | onnx | onnx-int8
+ENCODE_BATCH_SIZE = int(os.getenv("ENCODE_BATCH_SIZE", "32"))     # texts per forward pass
+EMBED_PROCESSES = int(os.getenv("EMBED_PROCESSES", "0"))      # >1 = process pool for bulk ingest
+QUERY_BATCH_SIZE = int(os.getenv("QUERY_BATCH_SIZE", "32"))
+QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", "3"))
+
+# Pre-quantized ONNX export shipped in the model repo
+ONNX_INT8_FILE = os.getenv("ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+
+def load_model(model_name=EMBEDDING_MODEL, backend=EMBEDDING_BACKEND, cache_folder=None):
+    """Load a CPU SentenceTransformer for the requested backend"""
+    from sentence_transformers import SentenceTransformer
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {BACKENDS}")
+
+    if backend.startswith("onnx"):
+        # Needs optimum[onnxruntime]; not in requirements.txt, so fall back if missing
+        try:
+            model_kwargs = {"file_name": ONNX_INT8_FILE} if backend == "onnx-int8" else {}
+            return SentenceTransformer(
+                model_name, device="cpu", cache_folder=cache_folder,
+                backend="onnx", model_kwargs=model_kwargs
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ ONNX backend unavailable ({e}), using torch")
+            backend = "torch"
+
+    model = SentenceTransformer(model_name, device="cpu", cache_folder=cache_folder)
+    if backend == "torch-int8":
+        import torch
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+def length_buckets(texts, batch_size):
+    """Index batches of similar-length texts, so each batch pads to a similar length"""
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def embed_matrix(embeddings, texts):
+    """float32 matrix from any LangChain Embeddings, skipping the list round trip for EmbeddingEngine"""
+    if isinstance(embeddings, EmbeddingEngine):
+        return embeddings.encode_documents(texts)
+    return np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+
+
+# --- process pool workers ---------------------------------------------------
+
+_worker_model = None
+
+
+def _init_worker(model_name, backend, cache_folder, threads):
+    global _worker_model
+    import torch
+    torch.set_num_threads(threads)
+    _worker_model = load_model(model_name, backend, cache_folder)
+
+
+def _worker_encode(texts):
+    return _worker_model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+
+
+class EmbeddingEngine(Embeddings):
+    """
+    Shared embedding engine for ingest and the query path (a LangChain Embeddings,
+    so FAISS accepts it directly). Documents are encoded in length-bucketed batches,
+    optionally across a process pool; concurrent async queries share one forward pass.
+    """
+
+    def __init__(
+        self,
+        model_name=EMBEDDING_MODEL,
+        backend=EMBEDDING_BACKEND,
+        batch_size=ENCODE_BATCH_SIZE,
+        processes=EMBED_PROCESSES,
+        cache_folder=None
+    ):
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.processes = processes
+        self.cache_folder = cache_folder
+        self.model = load_model(model_name, backend, cache_folder)
+        self._pool = None
+        self._batcher = MicroBatcher(
+            self._encode_queries, max_batch=QUERY_BATCH_SIZE, window_ms=QUERY_BATCH_WINDOW_MS
+        )
+        logger.info(f"✅ Embedding engine ready ({model_name}, backend={backend})")
+
+    def _encode(self, texts):
+        return self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+
+    def _get_pool(self):
+        if self._pool is None:
+            threads = max(1, (os.cpu_count() or 1) // self.processes)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.processes,
+                # spawn: forking a process with torch threads running can deadlock
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name, self.backend, self.cache_folder, threads)
+            )
+        return self._pool
+
+    def encode_documents(self, texts):
+        """Embed texts as a float32 matrix, row i = texts[i]"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        buckets = length_buckets(texts, self.batch_size)
+        batches = [[texts[i] for i in bucket] for bucket in buckets]
+
+        if self.processes > 1 and len(batches) > 1:
+            results = list(self._get_pool().map(_worker_encode, batches))
+        else:
+            results = [self._encode(batch) for batch in batches]
+
+        out = np.empty((len(texts), results[0].shape[1]), dtype=np.float32)
+        for bucket, vectors in zip(buckets, results):
+            out[bucket] = vectors
+        return out
+
+    def embed_documents(self, texts):
+        return self.encode_documents(texts).tolist()
+
+    def embed_query(self, text):
+        return self._encode([text])[0].tolist()
+
+    def _encode_queries(self, texts):
+        return [vector.tolist() for vector in self._encode(texts)]
+
+    async def aembed_query(self, text):
+        """Micro-batched: queries arriving within a few ms share one forward pass"""
+        return await self._batcher.submit(text)
+
+    def stats(self):
+        return {"backend": self.backend, "query_batches": self._batcher.stats()}
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -0,0 +1,47 @@
+import os
+import json
+import xxhash
+
+# Per-URL ingest state, kept next to the local vector store:
+# {
+#   "pages": {url: {"hash", "etag", "last_modified", "links", "chunk_ids"}},
+#   "artifacts": {filename: xxh64 in the last published store version}
+# }
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"   # float32 embeddings aligned with chunk store rows
+
+
+def content_hash(text):
+    return xxhash.xxh64(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(url, ordinal, chunk_hash):
+    """Stable id: page + position + chunk content hash"""
+    return f"{xxhash.xxh64(url.encode('utf-8')).hexdigest()}:{ordinal}:{chunk_hash[:8]}"
+
+
+def file_hash(path, block_size=1 << 20):
+    digest = xxhash.xxh64()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(folder):
+    path = os.path.join(folder, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"pages": {}, "artifacts": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    manifest.setdefault("pages", {})
+    manifest.setdefault("artifacts", {})
+    return manifest
+
+
+def save_manifest(folder, manifest):
+    path = os.path.join(folder, MANIFEST_FILE)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
@@ -0,0 +1,261 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+import numpy as np
+from chunk_store import ChunkStore, ChunkStoreWriter, has_chunk_store
+from vector_index import IndexBuilder
+from ingest_manifest import VECTORS_FILE, content_hash, chunk_id
+from embedding_engine import embed_matrix
+from sparse_index import BM25Builder
+from chunker import CHUNK_PROCESSES, chunk_page
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))   # chunks per embedding call (split into ENCODE_BATCH_SIZE buckets)
+QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))   # items buffered between stages
+
+_DONE = object()
+
+
+class StageStats:
+    """Throughput counters for one pipeline stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.items_in = 0
+        self.items_out = 0
+        self.busy = 0.0   # seconds spent working (not waiting on queues)
+
+    def report(self, wall):
+        return {
+            "stage": self.name,
+            "in": self.items_in,
+            "out": self.items_out,
+            "busy_s": round(self.busy, 2),
+            "out_per_busy_s": round(self.items_out / self.busy, 1) if self.busy else None,
+            "utilization": round(self.busy / wall, 2) if wall else None,
+        }
+
+
+class PreviousBuild:
+    """Rows of the last build, read lazily from its mmapped chunk store and vectors"""
+
+    def __init__(self, folder):
+        self.store = ChunkStore(folder)
+        self.vectors = np.load(os.path.join(folder, VECTORS_FILE), mmap_mode="r")
+        if len(self.vectors) != len(self.store):
+            raise ValueError("vectors.npy does not match the chunk store")
+        self.rows = {}
+        for i in range(len(self.store)):
+            self.rows.setdefault(self.store.metadata(i).get("url"), []).append(i)
+
+    @classmethod
+    def load(cls, folder, manifest):
+        if not (manifest["pages"] and has_chunk_store(folder)
+                and os.path.exists(os.path.join(folder, VECTORS_FILE))):
+            return None
+        try:
+            return cls(folder)
+        except ValueError as e:
+            logger.warning(f"⚠️ {e}, doing a full rebuild")
+            return None
+
+    def page(self, url):
+        rows = self.rows[url]
+        texts = [self.store.text(i) for i in rows]
+        metas = [self.store.metadata(i) for i in rows]
+        return texts, metas, np.asarray(self.vectors[rows], dtype=np.float32)
+
+
+class IngestPipeline:
+    """
+    crawl -> chunk -> embed -> index, connected by bounded queues so a slow stage
+    pauses the ones before it. Pages are chunked as they arrive, chunks are embedded
+    in fixed-size batches and appended to the index, chunk store and BM25 postings
+    as they come out.
+    """
+
+    def __init__(self, crawler, embeddings, folder, index_type, manifest, previous=None, chunk_pool=None):
+        self.crawler = crawler
+        self.chunk_pool = chunk_pool   # None = split on the default thread executor
+        self.embeddings = embeddings
+        self.folder = folder
+        self.manifest = manifest
+        self.previous = previous
+
+        self.builder = IndexBuilder(index_type)
+        self.writer = None
+        self.sparse = BM25Builder()
+        self.vectors = []
+        self.pages = {}
+        self.counts = {"unchanged": 0, "changed": 0, "new": 0, "deleted": 0}
+        self.embedded = 0
+        self.stats = {name: StageStats(name) for name in ("crawl", "chunk", "embed", "index")}
+        self.wall = 0.0
+
+        self._pages = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._chunks = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._embedded = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    # --- stages ---------------------------------------------------------
+
+    async def _crawl(self):
+        stats = self.stats["crawl"]
+        last = time.perf_counter()
+
+        async def on_page(page):
+            nonlocal last
+            stats.busy += time.perf_counter() - last
+            stats.items_out += 1
+            await self._pages.put(page)
+            last = time.perf_counter()
+
+        await self.crawler.crawl(on_page=on_page)
+        await self._pages.put(_DONE)
+
+    async def _chunk(self):
+        stats = self.stats["chunk"]
+        # Several pages split at once (one per pool worker), handed on in arrival order
+        in_flight = deque()
+        window = max(1, CHUNK_PROCESSES)
+
+        async def drain(limit):
+            while len(in_flight) > limit:
+                started, task = in_flight.popleft()
+                item = await task
+                stats.busy += time.perf_counter() - started
+                if item is not None:
+                    stats.items_out += len(item[1])
+                    await self._chunks.put(item)
+
+        while (page := await self._pages.get()) is not _DONE:
+            stats.items_in += 1
+            in_flight.append((time.perf_counter(), asyncio.ensure_future(self._plan_page(page))))
+            await drain(window)
+        await drain(0)
+        await self._chunks.put(_DONE)
+
+    async def _embed(self):
+        stats = self.stats["embed"]
+        batch_texts, batch_metas = [], []
+
+        async def flush():
+            start = time.perf_counter()
+            vectors = await asyncio.to_thread(embed_matrix, self.embeddings, list(batch_texts))
+            stats.busy += time.perf_counter() - start
+            stats.items_out += len(batch_texts)
+            self.embedded += len(batch_texts)
+            await self._embedded.put((list(batch_texts), list(batch_metas), vectors))
+            batch_texts.clear()
+            batch_metas.clear()
+
+        while (item := await self._chunks.get()) is not _DONE:
+            kind, texts, metas, vectors = item
+            stats.items_in += len(texts)
+            if kind == "reuse":
+                # Unchanged page: vectors come from the previous build
+                await self._embedded.put((texts, metas, vectors))
+                continue
+            for text, meta in zip(texts, metas):
+                batch_texts.append(text)
+                batch_metas.append(meta)
+                if len(batch_texts) >= EMBED_BATCH_SIZE:
+                    await flush()
+
+        if batch_texts:
+            await flush()
+        await self._embedded.put(_DONE)
+
+    async def _index(self):
+        stats = self.stats["index"]
+        while (item := await self._embedded.get()) is not _DONE:
+            texts, metas, vectors = item
+            stats.items_in += len(texts)
+            start = time.perf_counter()
+            for text, meta in zip(texts, metas):
+                self.writer.add(text, meta)
+                self.sparse.add(text)
+            await asyncio.to_thread(self.builder.add, vectors)
+            self.vectors.append(vectors)
+            stats.busy += time.perf_counter() - start
+            stats.items_out += len(texts)
+
+    # --- page diffing -----------------------------------------------------
+
+    async def _plan_page(self, page):
+        """Decide reuse vs re-chunk for one crawled page; returns a queue item or None"""
+        url = page["url"]
+        old = self.manifest["pages"].get(url)
+        has_previous = self.previous is not None and old is not None and url in self.previous.rows
+        status = page["status"]
+
+        if status == "gone" or (status == "ok" and not page["content"]):
+            return None
+        if status in ("not_modified", "error"):
+            # Keep the last good version; errors must not purge a page
+            if not has_previous:
+                return None
+            page_hash = old["hash"]
+        else:
+            page_hash = content_hash(page["content"])
+
+        if has_previous and old["hash"] == page_hash:
+            self.counts["unchanged"] += 1
+            self.pages[url] = {
+                **old,
+                "etag": page.get("etag") or old.get("etag"),
+                "last_modified": page.get("last_modified") or old.get("last_modified"),
+                "links": page.get("links", old.get("links", [])),
+            }
+            texts, metas, vectors = await asyncio.to_thread(self.previous.page, url)
+            return ("reuse", texts, metas, vectors)
+
+        loop = asyncio.get_running_loop()
+        docs = await loop.run_in_executor(
+            self.chunk_pool, chunk_page, url, page.get("title", ""), page["content"]
+        )
+        texts = [doc.page_content for doc in docs]
+        metas = [doc.metadata for doc in docs]
+        self.counts["changed" if old else "new"] += 1
+        self.pages[url] = {
+            "hash": page_hash,
+            "etag": page.get("etag"),
+            "last_modified": page.get("last_modified"),
+            "links": page.get("links", []),
+            "chunk_ids": [chunk_id(url, m["ordinal"], m["hash"]) for m in metas],
+        }
+        return ("embed", texts, metas, None)
+
+    # --- driver -------------------------------------------------------------
+
+    async def run(self):
+        self.writer = ChunkStoreWriter(self.folder)
+        start = time.perf_counter()
+        try:
+            async with asyncio.TaskGroup() as group:
+                group.create_task(self._crawl())
+                group.create_task(self._chunk())
+                group.create_task(self._embed())
+                group.create_task(self._index())
+        except BaseException:
+            self.writer.abort()
+            raise
+        self.wall = time.perf_counter() - start
+        self.counts["deleted"] = len(set(self.manifest["pages"]) - set(self.pages))
+
+        for stats in self.stats.values():
+            logger.info(f"📊 {stats.report(self.wall)}")
+        return self
+
+    @property
+    def changed(self):
+        return self.previous is None or self.embedded > 0 or self.counts["deleted"] > 0
+
+    def all_vectors(self):
+        return np.concatenate(self.vectors) if self.vectors else np.zeros((0, 0), dtype=np.float32)
+
+    def stage_reports(self):
+        return [stats.report(self.wall) for stats in self.stats.values()]
@@ -1,13 +1,15 @@
 import logging
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 
 from chat import router as chat_router
 from voice_chat import router as voice_router
-from rag_engine import start_loading_vectorstore, initialize_gemini
+from admin import router as admin_router
+from rag_engine import start_loading_vectorstore, initialize_gemini, is_ready
+from readiness import NotReadyError, readiness
 
 
 # App Initialization
@@ -38,18 +40,67 @@ async def startup_tasks():
     start_loading_vectorstore()
 
     # Initialize Database
+    # Index migrations run out of band: python chat_maintenance.py --migrate
     try:
-        from database import engine, Base
+        from database import init_models
         import models  # Ensures models are registered
-        Base.metadata.create_all(bind=engine)
+        await init_models()
         logger.info("✓ Database tables synchronized")
     except Exception as e:
         logger.error(f"⚠ DB initialization failed: {e}")
 
+    try:
+        from chat_maintenance import retention_job
+        retention_job.start()
+    except Exception as e:
+        logger.error(f"⚠ Chat retention job failed to start: {e}")
+
+    try:
+        from chat_writer import chat_writer
+        chat_writer.start()
+    except Exception as e:
+        logger.error(f"⚠ Chat writer failed to start: {e}")
+
+
+@app.on_event("shutdown")
+async def shutdown_tasks():
+    from chat_writer import chat_writer
+    from chat_maintenance import retention_job
+    from database import dispose
+    await retention_job.stop()
+    await chat_writer.stop()   # flush queued chat rows before the pool goes away
+    await dispose()
+
 
 # Routers
 app.include_router(chat_router)
 app.include_router(voice_router)
+app.include_router(admin_router)
+
+
+# Health Checks
+@app.exception_handler(NotReadyError)
+async def not_ready_handler(request: Request, exc: NotReadyError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc), "state": exc.state},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up (also while the vector store loads)"""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: route traffic here only once the vector store is served"""
+    body = {"ready": is_ready(), "vectorstore": readiness.snapshot()}
+    if not body["ready"]:
+        return JSONResponse(status_code=503, content=body, headers={"Retry-After": str(readiness.retry_after())})
+    return body
 
 
 # Root Redirect
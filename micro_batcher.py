@@ -0,0 +1,71 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Groups concurrent submit() calls into one batch_fn(items) call.
+    A batch runs when max_batch items are waiting or window_ms after the first
+    one arrived, whichever comes first. batch_fn is blocking and runs on executor;
+    it must return one result per item, in order.
+    """
+
+    def __init__(self, batch_fn, max_batch=32, window_ms=3.0, executor=None):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self.executor = executor
+        self._pending = []
+        self._timer = None
+        self._tasks = set()   # the loop only keeps weak references to running batches
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        loop = asyncio.get_running_loop()
+        items = [item for item, _ in batch]
+        self.batches += 1
+        self.items += len(items)
+
+        try:
+            results = await loop.run_in_executor(self.executor, self.batch_fn, items)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
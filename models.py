@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
 from database import Base
 from datetime import datetime
 
@@ -6,8 +6,27 @@ class Chat(Base):
     __tablename__ = "chats_info"
 
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(String(100), index=True)
+    session_id = Column(String(100))   # indexed as the leading column of ix_chats_info_session_created
     user_id = Column(String(36), index=True, nullable=False)
     question = Column(Text, nullable=False)
     answer = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Every read is "this session, newest/oldest first"; retention scans by age.
+    # Existing tables get these from `python chat_maintenance.py --migrate`.
+    __table_args__ = (
+        Index("ix_chats_info_session_created", "session_id", "created_at"),
+        Index("ix_chats_info_created_at", "created_at"),
+    )
+
+
+class ChatArchive(Base):
+    """Rows moved out of chats_info by the retention job (same columns, ids kept)"""
+    __tablename__ = "chats_info_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    session_id = Column(String(100))
+    user_id = Column(String(36), nullable=False)
+    question = Column(Text, nullable=False)
+    answer = Column(Text, nullable=False)
+    created_at = Column(DateTime, index=True)
@@ -0,0 +1,86 @@
+import os
+import threading
+import logging
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", "3600"))
+
+
+def normalize_query(text):
+    """Normalize query text so trivial variations share a cache entry"""
+    return " ".join(text.lower().split())
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU/TTL cache of query embeddings and top-k document ids"""
+
+    def __init__(self, maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL):
+        self._embeddings = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._results = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Bumped on clear() so results computed against an old index are dropped
+        self.generation = 0
+
+    def peek_embedding(self, query):
+        """Cached embedding for query or None; counts as a hit/miss"""
+        with self._lock:
+            embedding = self._embeddings.get(normalize_query(query))
+            if embedding is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return embedding
+
+    def put_embedding(self, query, embedding):
+        with self._lock:
+            self._embeddings[normalize_query(query)] = embedding
+
+    def get_embedding(self, query, embed_fn):
+        """Return the cached embedding for query, computing it on a miss"""
+        embedding = self.peek_embedding(query)
+        if embedding is None:
+            # Embed outside the lock so concurrent misses don't serialize
+            embedding = embed_fn(query)
+            self.put_embedding(query, embedding)
+        return embedding
+
+    def get_doc_ids(self, query, k):
+        """Return cached top-k document ids for query, or None (a miss falls through to get_embedding)"""
+        with self._lock:
+            doc_ids = self._results.get((normalize_query(query), k))
+            if doc_ids is not None:
+                self.hits += 1
+            return doc_ids
+
+    def put_doc_ids(self, query, k, doc_ids, generation=None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._results[(normalize_query(query), k)] = list(doc_ids)
+
+    def clear(self):
+        """Drop every entry; called whenever a new index is installed"""
+        with self._lock:
+            self._embeddings.clear()
+            self._results.clear()
+            self.generation += 1
+        logger.info("🧹 Query embedding cache cleared")
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "size": len(self._embeddings),
+            }
+
+
+query_cache = QueryEmbeddingCache()
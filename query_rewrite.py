@@ -0,0 +1,91 @@
+import os
+import re
+import threading
+import logging
+from cachetools import TTLCache
+from query_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+REWRITE_MODE = os.getenv("QUERY_REWRITE_MODE", "parallel")              # always | heuristic | parallel
+REWRITE_TIMEOUT_MS = float(os.getenv("QUERY_REWRITE_TIMEOUT_MS", "1500"))  # parallel: give up and use raw results
+REWRITE_CACHE_SIZE = int(os.getenv("REWRITE_CACHE_SIZE", "2048"))
+REWRITE_CACHE_TTL = int(os.getenv("REWRITE_CACHE_TTL", "1800"))
+
+REWRITE_MODES = ("always", "heuristic", "parallel")
+
+# Words that only make sense with the earlier turns in view
+ANAPHORA = re.compile(
+    r"\b(it|its|it's|this|that|these|those|they|them|their|theirs|he|him|his|she|her|"
+    r"one|ones|same|such|there|then|above|previous|former|latter|else|more|another|"
+    r"also|too|either|neither)\b",
+    re.IGNORECASE,
+)
+# Openers that continue the previous question ("and for startups?", "what about pricing?")
+CONTINUATION = re.compile(r"^\s*(and|or|but|so|also|what about|how about|why not|same for)\b", re.IGNORECASE)
+MIN_STANDALONE_WORDS = 4
+
+
+def needs_rewrite(question):
+    """True when the question probably leans on earlier turns (pronouns, ellipsis, very short)"""
+    if len(question.split()) < MIN_STANDALONE_WORDS:
+        return True
+    return bool(ANAPHORA.search(question) or CONTINUATION.search(question))
+
+
+def merge_ranked(primary, secondary, k):
+    """Interleave two ranked id lists (primary first), dropping duplicates, cut to k"""
+    merged = []
+    for pair in zip(primary, secondary):
+        for doc_id in pair:
+            if doc_id not in merged:
+                merged.append(doc_id)
+    longer = primary if len(primary) > len(secondary) else secondary
+    for doc_id in longer[min(len(primary), len(secondary)):]:
+        if doc_id not in merged:
+            merged.append(doc_id)
+    return merged[:k]
+
+
+class RewriteCache:
+    """Rewritten questions keyed by (session, last turn, question)"""
+
+    def __init__(self, maxsize=REWRITE_CACHE_SIZE, ttl=REWRITE_CACHE_TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(session_id, chat_history, question):
+        # created_at, not id: turns still queued in the chat writer have no id yet
+        last_turn = chat_history[-1].created_at if chat_history else None
+        return (session_id, last_turn, normalize_query(question))
+
+    def get(self, key):
+        with self._lock:
+            rewritten = self._cache.get(key)
+            if rewritten is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return rewritten
+
+    def put(self, key, rewritten):
+        with self._lock:
+            self._cache[key] = rewritten
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+# Shared instance used by rag_engine
+rewrite_cache = RewriteCache()
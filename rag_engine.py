@@ -1,13 +1,39 @@
 import os
+import gc
+import random
+import time
+import shutil
+import asyncio
 import threading
 import traceback
 import logging
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from supabase_manager import SupabaseStorageManager
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
 from google import genai
 from dotenv import load_dotenv
+from sqlalchemy import select
 from models import Chat   # ✅ REQUIRED IMPORT
+from chat_writer import chat_writer
+from conversation_cache import conversation_cache
+from query_cache import query_cache
+from semantic_cache import semantic_cache
+from vector_index import (
+    PARAMS_FILE, DEFAULT_NPROBE, DEFAULT_EF_SEARCH,
+    load_index_params, set_search_params, load_vectorstore_files, filtered_search
+)
+from chunk_store import CHUNK_FILES
+from sparse_index import SPARSE_FILES, BM25Index, has_sparse_index, rrf_fuse
+from reranker import reranker
+from store_versions import fetch_current
+from artifact_cache import CACHE_DIR, ArtifactCache, prune_cache
+from context_packer import pack_context
+from embedding_engine import EmbeddingEngine
+from micro_batcher import MicroBatcher
+from readiness import readiness
+from query_rewrite import (
+    REWRITE_MODE, REWRITE_TIMEOUT_MS, needs_rewrite, merge_ranked, rewrite_cache
+)
 
 load_dotenv()
 
@@ -18,13 +44,41 @@ logger = logging.getLogger(__name__)
 # Configuration
 BUCKET_NAME = os.getenv("SUPABASE_BUCKET_NAME", "vectorstore-bucket")
 REMOTE_FOLDER = "vectorstore"
-LOCAL_PATH = "/tmp/vectorstore"
+LOCAL_PATH = "/tmp/vectorstore"                                        # one subfolder per version
+VECTORSTORE_POLL_SECONDS = int(os.getenv("VECTORSTORE_POLL_SECONDS", "0"))   # 0 = no poller
+GEMINI_MODEL = "gemini-2.0-flash"
+RAG_WORKERS = int(os.getenv("RAG_WORKERS", "4"))
+TOP_K = int(os.getenv("RAG_TOP_K", "4"))                               # chunks passed to the prompt
+SEARCH_BATCH_SIZE = int(os.getenv("SEARCH_BATCH_SIZE", "32"))         # max queries per index.search
+SEARCH_BATCH_WINDOW_MS = float(os.getenv("SEARCH_BATCH_WINDOW_MS", "2"))
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"                 # BM25 + dense, fused with RRF
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))          # per retriever, before fusion
+READY_WAIT_SECONDS = float(os.getenv("READY_WAIT_SECONDS", "10"))      # request wait during warm-up; 0 = fail fast
+LOAD_RETRY_SECONDS = float(os.getenv("VECTORSTORE_LOAD_RETRY_SECONDS", "5"))   # first retry after a failed load
+LOAD_RETRY_MAX_SECONDS = float(os.getenv("VECTORSTORE_LOAD_RETRY_MAX_SECONDS", "300"))
+
+WARMUP_QUERIES = [
+    "What services does Primis Digital offer?",
+    "How can I contact Primis Digital?",
+    "Tell me about your projects",
+]
+
+NO_DOCS_MESSAGE = (
+    "I couldn't find relevant information in the Primis Digital knowledge base. "
+    "Could you rephrase your question?"
+)
 
 # Global variables
 db = None
-is_loading = True
+embeddings = None
+current_version = None
 gemini_client = None
 
+# Bounded pool for blocking work (embedding, FAISS and BM25 search, reranking)
+# so the event loop stays free while a request is in flight
+_executor = ThreadPoolExecutor(max_workers=RAG_WORKERS, thread_name_prefix="rag")
+_refresh_lock = threading.Lock()   # one download/swap at a time (poller and admin endpoint)
+
 
 def initialize_gemini():
     """Initialize Gemini client"""
@@ -42,98 +96,296 @@ def initialize_gemini():
         return False
 
 
-def load_vectorstore():
-    """Load vector store from Supabase"""
-    global db, is_loading
+def legacy_manifest(storage):
+    """Version manifest for the flat, pre-versioning layout under REMOTE_FOLDER"""
+    listing = {f.get("name"): f.get("metadata") or {} for f in storage.list_files(BUCKET_NAME, REMOTE_FOLDER)}
+    remote = set(listing)
+    names = ["index.faiss"]
+    # Prefer the mmap-friendly chunk store; older stores only have index.pkl
+    names += CHUNK_FILES if all(n in remote for n in CHUNK_FILES) else ["index.pkl"]
+    # Optional: BM25 postings and build params
+    if all(n in remote for n in SPARSE_FILES):
+        names += SPARSE_FILES
+    if PARAMS_FILE in remote:
+        names.append(PARAMS_FILE)
+    # No sha256 here: the cache is keyed by ETag and downloads are checked by size
+    files = {
+        name: {"path": f"{REMOTE_FOLDER}/{name}", "etag": listing[name].get("eTag"), "size": listing[name].get("size")}
+        for name in names
+    }
+    return {"version": "legacy", "files": files}
+
+
+def remote_manifest(storage):
+    """Published version; the legacy layout only when current.json doesn't exist (errors raise)"""
+    current = fetch_current(storage, BUCKET_NAME, REMOTE_FOLDER)
+    return current if current is not None else legacy_manifest(storage)
+
+
+def download_version(storage, manifest):
+    """
+    Materialize one version in LOCAL_PATH/<version>, shared by the workers on this host.
+    Files come from the local artifact cache when their content is already there;
+    the rest are streamed concurrently and verified before anything opens them.
+    """
+    folder = os.path.join(LOCAL_PATH, manifest["version"])
+    os.makedirs(folder, exist_ok=True)
+
+    # Artifacts this version doesn't have must not be picked up from an older download
+    for name in ["index.pkl", PARAMS_FILE] + CHUNK_FILES + SPARSE_FILES:
+        if name not in manifest["files"] and os.path.exists(os.path.join(folder, name)):
+            os.remove(os.path.join(folder, name))
+
+    started = time.perf_counter()
+    hits, downloads = ArtifactCache(storage, BUCKET_NAME).fetch_all(manifest["files"], folder)
+    logger.info(
+        f"✅ Version {manifest['version']} ready: {hits} cached, {downloads} downloaded "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+    return folder
+
+
+def open_store(folder, embedding_model):
+    """Open a downloaded version: FAISS index, chunk store, search params and BM25"""
+    store = load_vectorstore_files(folder, embedding_model)
+    index_params = load_index_params(folder)
+    nprobe = DEFAULT_NPROBE or index_params.get("nprobe")
+    ef_search = DEFAULT_EF_SEARCH or index_params.get("efSearch")
+    set_search_params(store.index, nprobe=nprobe, ef_search=ef_search)
+    logger.info(
+        f"🧭 Index type: {index_params.get('index_type')} "
+        f"(nprobe={nprobe}, efSearch={ef_search})"
+    )
 
-    try:
-        logger.info("📥 Starting vector store download...")
+    # Kept on the store object so a swap replaces dense and sparse together
+    store.sparse_index = BM25Index(folder) if has_sparse_index(folder) else None
+    if store.sparse_index is not None and len(store.sparse_index) != store.index.ntotal:
+        logger.warning("⚠️ BM25 index does not match the FAISS index, using dense search only")
+        store.sparse_index = None
+    logger.info(f"🔤 Hybrid search: {'on' if store.sparse_index is not None and HYBRID_SEARCH else 'off'}")
+    return store
+
+
+def warm_up(store, embedding_model):
+    """Run a few searches so the first real requests don't pay for cold mmapped pages"""
+    started = time.perf_counter()
+    for query in WARMUP_QUERIES:
+        vector = np.array([embedding_model.embed_query(query)], dtype=np.float32)
+        _, indices = store.index.search(vector, 4)
+        for i in indices[0]:
+            if i != -1:
+                store.docstore.search(store.index_to_docstore_id[i])
+        if store.sparse_index is not None:
+            store.sparse_index.search(query, 4)
+    logger.info(f"🔥 Warmed up with {len(WARMUP_QUERIES)} queries in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+def swap_in(store, version):
+    """
+    Read-copy-update: readers take `store = db` once per request, so rebinding db
+    never disturbs a search in flight; the old store is freed once the last of
+    them drops it. The cache generation is bumped after the swap (readers read it
+    before db), so results computed on the old store are never cached for the new one.
+    """
+    global db, current_version
+    previous_version = current_version
+    db = store
+    current_version = version
+    query_cache.clear()
+    semantic_cache.clear()
+
+    # Mapped files stay readable after unlinking, so older downloads can go now;
+    # the previous one is kept for workers that may still be opening it
+    for name in os.listdir(LOCAL_PATH):
+        path = os.path.join(LOCAL_PATH, name)
+        if name not in (version, previous_version) and os.path.isdir(path) and path != CACHE_DIR:
+            shutil.rmtree(path, ignore_errors=True)
+    if os.path.isdir(CACHE_DIR):
+        prune_cache(CACHE_DIR)
+    gc.collect()
+    logger.info(f"🔀 Serving vector store version {version} (was {previous_version})")
+    readiness.succeeded()   # also when an admin reload lands while the initial load is retrying
+
+
+def refresh_vectorstore(force=False):
+    """
+    Load the bucket's current version next to the one being served, warm it up
+    and swap it in. Returns the version being served afterwards.
+    """
+    global embeddings
+
+    with _refresh_lock:
+        storage = SupabaseStorageManager()
+        manifest = remote_manifest(storage)
+        if manifest["version"] == current_version and not force:
+            return current_version
 
+        logger.info(f"📥 Loading vector store version {manifest['version']}...")
         os.makedirs(LOCAL_PATH, exist_ok=True)
-        storage = SupabaseStorageManager()
+        folder = download_version(storage, manifest)
 
-        files_to_download = ["index.faiss", "index.pkl"]
+        if embeddings is None:
+            logger.info("🔧 Initializing embeddings...")
+            embeddings = EmbeddingEngine(cache_folder="/app/model_cache")
 
-        for filename in files_to_download:
-            remote_path = f"{REMOTE_FOLDER}/{filename}"
-            local_file = os.path.join(LOCAL_PATH, filename)
+        logger.info("📚 Loading FAISS index...")
+        store = open_store(folder, embeddings)
+        warm_up(store, embeddings)
+        swap_in(store, manifest["version"])
+        return current_version
 
-            logger.info(f"⬇️  Downloading {remote_path}...")
-            success = storage.download_file(remote_path, local_file, BUCKET_NAME)
 
-            if not success:
-                raise Exception(f"Failed to download {remote_path}")
+def load_vectorstore():
+    """Initial load of the vector store from Supabase, retried with backoff until it succeeds"""
+    delay = LOAD_RETRY_SECONDS
+    while True:
+        readiness.loading()
+        try:
+            refresh_vectorstore()
+            logger.info("🎉 Vector store ready!")
+            return
+        except Exception as e:
+            retry_in = delay * random.uniform(0.5, 1.0)   # jitter: don't retry in lockstep with other instances
+            readiness.failed(e, retry_in)
+            logger.error(f"❌ Vector store loading failed (attempt {readiness.attempts}), retrying in {retry_in:.0f}s: {e}")
+            logger.error(traceback.format_exc())
+            time.sleep(retry_in)
+            delay = min(delay * 2, LOAD_RETRY_MAX_SECONDS)
+
+
+async def wait_until_ready(timeout=READY_WAIT_SECONDS):
+    """
+    Gate for request handlers: returns once the vector store serves, waiting at most
+    timeout during warm-up. Raises NotReadyError (fast after a failed load), so no
+    history query, rewrite or transcription is paid for on a cold instance.
+    """
+    await readiness.wait(timeout)
+
+
+def is_ready():
+    """Readiness for load balancers: a store is served and Gemini is configured"""
+    return readiness.ready and gemini_client is not None
+
+
+def poll_vectorstore_versions():
+    """Background loop: pick up newly published versions without a restart"""
+    while True:
+        time.sleep(VECTORSTORE_POLL_SECONDS)
+        try:
+            refresh_vectorstore()
+        except Exception as e:
+            logger.error(f"❌ Vector store refresh failed, still serving {current_version}: {e}")
 
-            if os.path.exists(local_file):
-                size = os.path.getsize(local_file)
-                logger.info(f"✅ Downloaded {filename}: {size:,} bytes")
-            else:
-                raise Exception(f"File not found after download: {filename}")
 
-        logger.info("🔧 Initializing embeddings...")
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2",
-            cache_folder="/app/model_cache"
-        )
+def start_loading_vectorstore():
+    """Start loading vector store in background thread"""
+    thread = threading.Thread(target=load_vectorstore, daemon=True)
+    thread.start()
+    logger.info("🔄 Vector store loading in background...")
 
-        logger.info("📚 Loading FAISS index...")
-        db = FAISS.load_local(
-            LOCAL_PATH,
-            embeddings,
-            allow_dangerous_deserialization=True
-        )
+    if VECTORSTORE_POLL_SECONDS > 0:
+        threading.Thread(target=poll_vectorstore_versions, daemon=True).start()
+        logger.info(f"🔁 Polling for new vector store versions every {VECTORSTORE_POLL_SECONDS}s")
 
-        test_results = db.similarity_search("test query", k=1)
-        logger.info(f"✅ Vector store loaded! Test search returned {len(test_results)} results")
 
-        if test_results:
-            logger.info(f"📄 Sample content: {test_results[0].page_content[:200]}...")
+def search_vectors(store, vectors, ks):
+    """One index.search for several query vectors; returns the doc ids for each, cut to its k"""
+    _, indices = store.index.search(np.array(vectors, dtype=np.float32), max(ks))
+    return [
+        [store.index_to_docstore_id[i] for i in row[:k] if i != -1]
+        for row, k in zip(indices, ks)
+    ]
 
-        is_loading = False
-        logger.info("🎉 Vector store ready!")
 
-    except Exception as e:
-        logger.error(f"❌ Vector store loading failed: {str(e)}")
-        logger.error(traceback.format_exc())
-        is_loading = False
+def sparse_index_for(store):
+    return getattr(store, "sparse_index", None) if HYBRID_SEARCH else None
 
 
-def start_loading_vectorstore():
-    """Start loading vector store in background thread"""
-    thread = threading.Thread(target=load_vectorstore, daemon=True)
-    thread.start()
-    logger.info("🔄 Vector store loading in background...")
+def fuse_hybrid(store, dense_ids, sparse_hits, k):
+    """RRF over the dense doc ids and the BM25 (row, score) hits"""
+    sparse_ids = [store.index_to_docstore_id[row] for row, _ in sparse_hits]
+    return rrf_fuse([dense_ids, sparse_ids], k)
 
 
-def get_answer(question, session_id=None, db_session=None):
-    global db, gemini_client
+def search_batch(items):
+    """
+    MicroBatcher callback: items are (store, embedding, k) from concurrent requests.
+    Returns the doc ids per item; one index.search per store in the batch
+    (normally one, two only while an index swap is in flight).
+    """
+    results = [None] * len(items)
+    groups = {}
+    for i, (store, _, _) in enumerate(items):
+        groups.setdefault(id(store), []).append(i)
 
-    try:
-        search_query = question
+    for positions in groups.values():
+        store = items[positions[0]][0]
+        all_ids = search_vectors(store, [items[i][1] for i in positions], [items[i][2] for i in positions])
+        for i, doc_ids in zip(positions, all_ids):
+            results[i] = doc_ids
+    return results
 
-        if session_id and db_session:
-            chat_history = get_recent_messages(db_session, session_id)
 
-            if chat_history:
-                search_query = rewrite_question(chat_history, question)
-                logger.info(f"🔁 Rewritten query: {search_query}")
+_search_batcher = MicroBatcher(
+    search_batch, max_batch=SEARCH_BATCH_SIZE, window_ms=SEARCH_BATCH_WINDOW_MS, executor=_executor
+)
 
-        docs = db.similarity_search(search_query, k=4)
 
-        if not docs:
-            logger.warning("⚠️ No relevant documents found")
-            return (
-                "I couldn't find relevant information in the Primis Digital knowledge base. "
-                "Could you rephrase your question?"
-            )
+class SourceFilterError(ValueError):
+    """A url-filtered search on a store without per-chunk sources (legacy pickled store)"""
+
+
+def supports_source_filter():
+    store = db
+    return store is not None and hasattr(store.docstore, "rows_for")
+
+
+def search_sources(query, urls, k=4):
+    """
+    Search restricted to chunks from the given page urls (needs the chunk store).
+    Blocking and not cached; returns (doc_ids, docs).
+    """
+    store = db
+    if not hasattr(store.docstore, "rows_for"):
+        raise SourceFilterError("Filtering by urls needs a vector store with a chunk store")
+
+    rows = store.docstore.rows_for(urls)
+    embedding = query_cache.get_embedding(query, embeddings.embed_query)
+    sparse = sparse_index_for(store)
+    n = max(k, HYBRID_CANDIDATES) if sparse is not None else k
+
+    _, indices = filtered_search(store.index, [embedding], n, rows)
+    doc_ids = [store.index_to_docstore_id[i] for i in indices[0] if i != -1]
+    if sparse is not None:
+        doc_ids = fuse_hybrid(store, doc_ids, sparse.search(query, n, rows), k)
+    doc_ids = doc_ids[:k]
+    return doc_ids, [store.docstore.search(doc_id) for doc_id in doc_ids]
+
 
-        logger.info(f"📚 Found {len(docs)} relevant documents")
-        for i, doc in enumerate(docs):
-            logger.info(f"  Doc {i+1}: {doc.page_content[:100]}...")
+async def embed_query_async(query):
+    """Query embedding from the cache, else from the engine's micro-batched forward pass"""
+    embedding = query_cache.peek_embedding(query)
+    if embedding is None:
+        embedding = await embeddings.aembed_query(query)
+        query_cache.put_embedding(query, embedding)
+    return embedding
 
-        context = "\n\n---\n\n".join([doc.page_content for doc in docs])
 
-        prompt = f"""You are a helpful assistant for Primis Digital, a technology company.
+async def find_cached_answer_async(search_query, doc_ids):
+    """
+    Semantic cache lookup; returns (answer or None, query embedding).
+    The embedding is normally already cached by retrieval.
+    """
+    if not semantic_cache.enabled:
+        return None, None
+
+    embedding = await embed_query_async(search_query)
+    return semantic_cache.lookup(embedding, doc_ids), embedding
+
+
+def build_answer_prompt(context, question):
+    """Build the grounded answer prompt from retrieved context"""
+    return f"""You are a helpful assistant for Primis Digital, a technology company.
 
 Based on the following information from Primis Digital's website, answer the user's question accurately and professionally.
 
@@ -151,42 +403,260 @@ INSTRUCTIONS:
 
 ANSWER:"""
 
-        logger.info("🤖 Generating answer with Gemini...")
-        response = gemini_client.models.generate_content(
-            model="gemini-2.0-flash",
+
+def build_context(docs):
+    """Merge, de-duplicate and budget the retrieved documents into the prompt context"""
+    logger.info(f"📚 Found {len(docs)} relevant documents")
+    for i, doc in enumerate(docs):
+        logger.info(f"  Doc {i+1}: {doc.page_content[:100]}...")
+
+    return pack_context(docs)
+
+
+async def run_blocking(func, *args):
+    """Run a blocking call on the bounded RAG thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, func, *args)
+
+
+async def dense_search_async(store, search_query, k):
+    """Embedding and index search, both micro-batched across concurrent requests"""
+    embedding = await embed_query_async(search_query)
+    return await _search_batcher.submit((store, embedding, k))
+
+
+async def search_async(search_query, k=4, urls=None):
+    """
+    Cached, or dense and BM25 retrieval run concurrently and fused; returns (doc_ids, docs).
+    urls limits the search to chunks of those pages (search_sources).
+    """
+    if urls:
+        return await run_blocking(search_sources, search_query, urls, k)
+
+    generation = query_cache.generation   # read before db, see swap_in
+    store = db
+    doc_ids = query_cache.get_doc_ids(search_query, k)
+
+    if doc_ids is None:
+        sparse = sparse_index_for(store)
+        if sparse is None:
+            doc_ids = await dense_search_async(store, search_query, k)
+        else:
+            n = max(k, HYBRID_CANDIDATES)
+            dense_ids, sparse_hits = await asyncio.gather(
+                dense_search_async(store, search_query, n),
+                run_blocking(sparse.search, search_query, n)
+            )
+            doc_ids = fuse_hybrid(store, dense_ids, sparse_hits, k)
+        query_cache.put_doc_ids(search_query, k, doc_ids, generation)
+        logger.debug(f"🗃️ Search batches: {_search_batcher.stats()}")
+
+    return doc_ids, [store.docstore.search(doc_id) for doc_id in doc_ids]
+
+
+def log_rewrite(path, started, search_query):
+    elapsed = (time.perf_counter() - started) * 1000
+    logger.info(f"🔁 Rewrite path={path} ({elapsed:.0f} ms): {search_query}")
+
+
+def _cache_rewrite(key, task):
+    if not task.cancelled() and task.exception() is None:
+        rewrite_cache.put(key, task.result())
+
+
+async def rewrite_parallel(chat_history, question, key, k=4, urls=None):
+    """
+    Retrieve for the raw question while Gemini rewrites it, then merge both result lists.
+    Falls back to the raw results if the rewrite fails or misses REWRITE_TIMEOUT_MS
+    (it still finishes in the background and lands in the rewrite cache).
+    Returns (path, search_query, doc_ids, docs).
+    """
+    started = time.perf_counter()
+    rewrite_task = asyncio.create_task(rewrite_question_async(chat_history, question))
+    rewrite_task.add_done_callback(lambda task: _cache_rewrite(key, task))
+
+    raw_ids, raw_docs = await search_async(question, k, urls)
+
+    remaining = REWRITE_TIMEOUT_MS / 1000 - (time.perf_counter() - started)
+    try:
+        rewritten = await asyncio.wait_for(asyncio.shield(rewrite_task), max(remaining, 0))
+    except asyncio.TimeoutError:
+        return "raw_timeout", question, raw_ids, raw_docs
+    except Exception as e:
+        logger.warning(f"⚠️ Query rewrite failed, using the raw question: {e}")
+        return "raw_error", question, raw_ids, raw_docs
+
+    doc_ids, docs = await search_async(rewritten, k, urls)
+    merged = merge_ranked(doc_ids, raw_ids, k)
+    by_id = {**dict(zip(raw_ids, raw_docs)), **dict(zip(doc_ids, docs))}
+    return "parallel", rewritten, merged, [by_id[doc_id] for doc_id in merged]
+
+
+async def retrieve_async(question, session_id=None, db_session=None, urls=None):
+    """
+    Resolve follow-ups against history and fetch matching documents.
+    Standalone questions skip the history lookup and the Gemini rewrite entirely.
+    With a reranker, k * RERANK_FACTOR candidates are fetched and cut back to TOP_K.
+    urls restricts retrieval to chunks from those pages.
+    Returns (search_query, doc_ids, docs).
+    """
+    started = time.perf_counter()
+    path, search_query = "no_session", question
+    fetch_k = reranker.fetch_k(TOP_K)
+    results = None
+
+    if session_id and db_session:
+        path = "standalone"
+        if REWRITE_MODE == "always" or needs_rewrite(question):
+            chat_history = await get_recent_messages_async(db_session, session_id)
+            path = "no_history"
+
+            if chat_history:
+                key = rewrite_cache.key(session_id, chat_history, question)
+                cached = rewrite_cache.get(key)
+
+                if cached is not None:
+                    path, search_query = "cached", cached
+                elif REWRITE_MODE == "parallel":
+                    path, search_query, *results = await rewrite_parallel(chat_history, question, key, fetch_k, urls)
+                else:
+                    path = "rewritten"
+                    search_query = await rewrite_question_async(chat_history, question)
+                    rewrite_cache.put(key, search_query)
+
+    log_rewrite(path, started, search_query)
+    doc_ids, docs = results or await search_async(search_query, fetch_k, urls)
+
+    if reranker.enabled:
+        query_vector = await embed_query_async(search_query) if reranker.mode == "mmr" else None
+        doc_ids, docs = await run_blocking(
+            reranker.rerank, search_query, doc_ids, docs, TOP_K, embeddings, query_vector
+        )
+    return search_query, doc_ids, docs
+
+
+async def get_answer_async(question, session_id=None, db_session=None, urls=None):
+    """
+    Answer a question from the knowledge base: blocking steps run on the pool,
+    Gemini via the aio client.
+    Raises NotReadyError before any work while the vector store isn't serving.
+    """
+    global gemini_client
+
+    await wait_until_ready()
+    generation = semantic_cache.generation   # read before retrieval, see swap_in
+
+    try:
+        search_query, doc_ids, docs = await retrieve_async(question, session_id, db_session, urls)
+
+        if not docs:
+            logger.warning("⚠️ No relevant documents found")
+            return NO_DOCS_MESSAGE
+
+        cached_answer, embedding = await find_cached_answer_async(search_query, doc_ids)
+        if cached_answer is not None:
+            return cached_answer
+
+        context = build_context(docs)
+        prompt = build_answer_prompt(context, question)
+
+        logger.info("🤖 Generating answer with Gemini (async)...")
+        response = await gemini_client.aio.models.generate_content(
+            model=GEMINI_MODEL,
             contents=prompt
         )
 
         answer = response.text
         logger.info(f"✅ Answer generated: {len(answer)} characters")
 
+        if embedding is not None:
+            semantic_cache.add(embedding, doc_ids, answer, generation)
+
         return answer
 
+    except SourceFilterError:
+        raise   # the request can't be served; the endpoint answers 400
     except Exception as e:
-        logger.error(f"❌ Error in get_answer: {str(e)}")
+        logger.error(f"❌ Error in get_answer_async: {str(e)}")
         logger.error(traceback.format_exc())
         return f"Error generating answer: {str(e)}"
 
 
-def get_recent_messages(db, session_id, limit=5):
-    """Fetch recent chat messages for context"""
-    chats = (
-        db.query(Chat)
-        .filter(Chat.session_id == session_id)
+async def stream_answer_async(question, session_id=None, db_session=None, urls=None):
+    """Yield answer text pieces as Gemini streams them; errors propagate to the caller"""
+    global gemini_client
+
+    await wait_until_ready()
+    generation = semantic_cache.generation   # read before retrieval, see swap_in
+
+    search_query, doc_ids, docs = await retrieve_async(question, session_id, db_session, urls)
+
+    if not docs:
+        logger.warning("⚠️ No relevant documents found")
+        yield NO_DOCS_MESSAGE
+        return
+
+    cached_answer, embedding = await find_cached_answer_async(search_query, doc_ids)
+    if cached_answer is not None:
+        yield cached_answer
+        return
+
+    context = build_context(docs)
+    prompt = build_answer_prompt(context, question)
+
+    logger.info("🤖 Streaming answer from Gemini...")
+    stream = await gemini_client.aio.models.generate_content_stream(
+        model=GEMINI_MODEL,
+        contents=prompt
+    )
+
+    parts = []
+    async for chunk in stream:
+        if chunk.text:
+            parts.append(chunk.text)
+            yield chunk.text
+
+    answer = "".join(parts)
+    logger.info(f"✅ Answer streamed: {len(answer)} characters")
+
+    if embedding is not None:
+        semantic_cache.add(embedding, doc_ids, answer, generation)
+
+
+def recent_messages_query(session_id, limit=5):
+    return (
+        select(Chat)
+        .where(Chat.session_id == session_id)
         .order_by(Chat.created_at.desc())
         .limit(limit)
-        .all()
     )
-    return list(reversed(chats))
 
 
-def rewrite_question(chat_history, user_question):
-    """Convert follow-up questions into standalone questions"""
+async def get_recent_messages_async(db, session_id, limit=5):
+    """
+    Recent chat messages of a session for context, oldest first.
+    Served from the conversation cache when possible; a miss reads a whole window
+    (plus turns still queued in the chat writer) and caches it.
+    """
+    chats = await conversation_cache.recent(session_id, limit)
+    if chats is not None:
+        return chats
+
+    window = max(limit, conversation_cache.window)
+    result = await db.execute(recent_messages_query(session_id, window))
+    rows = result.scalars().all()
+    chats = list(reversed(chat_writer.overlay(rows, session_id, window)))
+    await conversation_cache.fill(session_id, chats, truncated=len(rows) >= window)
+    return chats[-limit:]
+
+
+def build_rewrite_prompt(chat_history, user_question):
+    """Build the prompt that turns a follow-up into a standalone question"""
     conversation = ""
     for chat in chat_history:
         conversation += f"User: {chat.question}\nAssistant: {chat.answer}\n"
 
-    prompt = f"""
+    return f"""
 You are a query rewriter.
 
 Given the conversation below and a follow-up question,
@@ -201,8 +671,13 @@ Follow-up question:
 Rewrite the question clearly:
 """
 
-    response = gemini_client.models.generate_content(
-        model="gemini-2.0-flash",
+
+async def rewrite_question_async(chat_history, user_question):
+    """Convert a follow-up question into a standalone question (aio Gemini client)"""
+    prompt = build_rewrite_prompt(chat_history, user_question)
+
+    response = await gemini_client.aio.models.generate_content(
+        model=GEMINI_MODEL,
         contents=prompt
     )
 
@@ -1,13 +1,17 @@
-import requests
-from bs4 import BeautifulSoup
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from urllib.parse import urljoin, urlparse
-import time
 import os
-import json
+import sys
+import asyncio
+import numpy as np
 from supabase_manager import SupabaseStorageManager
+from embedding_engine import EmbeddingEngine, EMBEDDING_BACKEND
+from crawler import Crawler
+from vector_index import INDEX_TYPE, PARAMS_FILE, IndexBuilder, load_index_params, recall_report, save_index
+from chunk_store import CHUNK_FILES, ChunkStore, ChunkStoreWriter
+from sparse_index import SPARSE_FILES, BM25Builder
+from chunker import chunk_pool
+from ingest_manifest import VECTORS_FILE, load_manifest, save_manifest
+from store_versions import upload_version
+from ingest_pipeline import IngestPipeline, PreviousBuild
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -20,132 +24,142 @@ print("SUPABASE_KEY =", "FOUND" if os.getenv("SUPABASE_KEY") else "MISSING")
 # Configuration
 BASE_URL = "https://primisdigital.com/"
 MAX_PAGES = 100
-DELAY = 1
 BUCKET_NAME = "vectorstore-bucket"
-
-def is_valid_url(url, base_domain):
-    """Check if URL belongs to the same domain"""
-    parsed = urlparse(url)
-    base_parsed = urlparse(base_domain)
-    return parsed.netloc == base_parsed.netloc
-
-def fetch_text(url):
-    """Extract text content from a URL using BeautifulSoup"""
+INCREMENTAL = os.getenv("INGEST_INCREMENTAL", "true").lower() == "true"
+
+def save_vectors(folder, vectors):
+    """Replace vectors.npy atomically; the previous build may still have it mmapped"""
+    path = os.path.join(folder, VECTORS_FILE)
+    with open(f"{path}.tmp", "wb") as f:
+        np.save(f, vectors)
+    os.replace(f"{path}.tmp", path)
+
+def ingest_website(incremental=INCREMENTAL, folder="vectorstore"):
+    """
+    Crawl the website and create (or incrementally update) the vector store.
+    Pages stream through crawl -> chunk -> embed -> index (see ingest_pipeline.py),
+    so peak memory no longer grows with the whole site's text.
+    """
+    os.makedirs(folder, exist_ok=True)
+    manifest = load_manifest(folder) if incremental else {"pages": {}, "artifacts": {}}
+    previous = PreviousBuild.load(folder, manifest) if incremental else None
+
+    # Step 1: Embeddings model and chunking pool used by the pipeline stages
+    print(f"🔧 Loading embeddings ({EMBEDDING_BACKEND})...")
+    embeddings = EmbeddingEngine()
+    pool = chunk_pool()
+
+    # Step 2: Crawl, chunk (per page, see chunker.py), embed and index in bounded stages
+    print(f"🚀 Starting crawl from: {BASE_URL}")
+    crawler = Crawler(BASE_URL, MAX_PAGES, known_pages=manifest["pages"] if previous else None)
+    pipeline = IngestPipeline(crawler, embeddings, folder, INDEX_TYPE, manifest, previous, chunk_pool=pool)
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        r = requests.get(url, timeout=10, headers=headers)
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-
-        # Remove unwanted tags
-        for tag in soup(["script", "style", "noscript", "header", "footer", "nav"]):
-            tag.decompose()
-
-        return soup.get_text(separator=" ", strip=True)
-    except Exception as e:
-        print(f"❌ Error fetching {url}: {e}")
-        return ""
-
-def get_all_links(url, base_url):
-    """Extract all internal links from a page"""
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        r = requests.get(url, timeout=10, headers=headers)
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-
-        links = set()
-        for link in soup.find_all('a', href=True):
-            href = link['href']
-            full_url = urljoin(base_url, href)
-            full_url = full_url.split('#')[0].split('?')[0]
-
-            if is_valid_url(full_url, base_url):
-                links.add(full_url)
-
-        return links
-    except Exception as e:
-        print(f"❌ Error getting links from {url}: {e}")
-        return set()
-
-def crawl_website(start_url, max_pages=MAX_PAGES):
-    """Crawl entire website starting from start_url"""
-    visited = set()
-    to_visit = {start_url}
-    all_pages = []
-
-    print(f"🚀 Starting crawl from: {start_url}")
+        asyncio.run(pipeline.run())
+    finally:
+        embeddings.close()
+        if pool is not None:
+            pool.shutdown()
+
+    print(f"\n🧾 Pages: {pipeline.counts}")
+    print(f"📄 Total chunks: {pipeline.builder.ntotal} ({pipeline.embedded} embedded)")
+    for report in pipeline.stage_reports():
+        print(f"   ⏱️ {report}")
+
+    if pipeline.builder.ntotal == 0:
+        pipeline.writer.abort()
+        print("❌ No content found!")
+        return
 
-    while to_visit and len(visited) < max_pages:
-        url = to_visit.pop()
-        if url in visited:
-            continue
+    if not pipeline.changed:
+        pipeline.writer.abort()
+        print("✅ Nothing changed since the last ingest")
+        return
 
-        print(f"🔹 [{len(visited) + 1}/{max_pages}] Crawling: {url}")
+    # Step 3: Finish (train, for IVF/PQ) and save the FAISS index locally
+    print(f"💾 Saving FAISS index ({INDEX_TYPE}) to local folder '{folder}'...")
+    index, index_params = pipeline.builder.finish()
+    vectors = pipeline.all_vectors()
+    if INDEX_TYPE != "flat":
+        index_params["report"] = recall_report(vectors, index)
+        print(f"📈 Recall vs flat baseline: {index_params['report']}")
+    save_index(folder, index, index_params)
+    pipeline.writer.close()
+    pipeline.sparse.save(folder)
+    save_vectors(folder, vectors)
+    manifest["pages"] = pipeline.pages
+    save_manifest(folder, manifest)
+
+    # Step 4: Upload to Supabase, skipping artifacts identical to the last upload
+    upload_artifacts(folder, manifest)
+
+
+def upload_artifacts(folder, manifest):
+    """Publish a new store version; files identical to the published ones are not re-uploaded"""
+    print("\n☁️ Connecting to Supabase...")
+    try:
+        storage = SupabaseStorageManager()
 
-        text = fetch_text(url)
-        if text:
-            all_pages.append({
-                "url": url,
-                "content": text
-            })
+        artifacts = ["index.faiss", PARAMS_FILE] + CHUNK_FILES + SPARSE_FILES
+        print(f"☁️ Publishing changed files to bucket: {BUCKET_NAME}...")
+        published = upload_version(storage, BUCKET_NAME, "vectorstore", folder, artifacts)
+        manifest["artifacts"] = {name: entry["hash"] for name, entry in published["files"].items()}
+        save_manifest(folder, manifest)
 
-        new_links = get_all_links(url, start_url)
-        to_visit.update(new_links - visited)
-        visited.add(url)
-        time.sleep(DELAY)
+        print(f"\n✅ Success! Serving version {published['version']} from Supabase.")
+    except Exception as e:
+        print(f"\n❌ Supabase Upload Failed: {e}")
+        print("Check if 'vectorstore-bucket' exists in your Supabase Storage dashboard.")
 
-    return all_pages
 
-def ingest_website():
-    """Main function to crawl website and create vector store"""
-    
-    # Step 1: Crawl website
-    all_pages = crawl_website(BASE_URL, MAX_PAGES)
+def delete_pages(urls, folder="vectorstore"):
+    """
+    Remove every chunk of the given page urls without re-crawling or re-embedding:
+    the kept rows' stored vectors are re-indexed and the chunk store rewritten.
+    """
+    manifest = load_manifest(folder)
+    store = ChunkStore(folder)
+    vectors = np.load(os.path.join(folder, VECTORS_FILE), mmap_mode="r")
+    keep = np.setdiff1d(np.arange(len(store)), store.rows_for(urls))
 
-    if not all_pages:
-        print("❌ No content found!")
+    if len(keep) == len(store):
+        print("✅ None of those pages are in the vector store")
+        return
+    if len(keep) == 0:
+        print("❌ Refusing to delete every page; run a full ingest instead")
         return
 
-    # Step 2: Combine and Chunk Text
-    full_text = "\n\n".join([f"--- PAGE: {p['url']} ---\n\n{p['content']}" for p in all_pages])
-    
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=500,
-        chunk_overlap=50
-    )
-    chunks = splitter.split_text(full_text)
-    print(f"\n📄 Total chunks created: {len(chunks)}")
-
-    # Step 3: Create embeddings
-    print("🔧 Creating embeddings (HuggingFace)...")
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
-
-    # Step 4: Create and Save FAISS vector store locally
-    print("💾 Saving FAISS index to local folder 'vectorstore'...")
-    db = FAISS.from_texts(chunks, embeddings)
-    db.save_local("vectorstore")
-
-    # Step 5: Upload to Supabase (The New Part)
-    print("\n☁️ Connecting to Supabase...")
+    index_type = load_index_params(folder).get("index_type", INDEX_TYPE)
+    builder = IndexBuilder(index_type)
+    writer = ChunkStoreWriter(folder)
+    sparse = BM25Builder()
     try:
-        storage = SupabaseStorageManager()
-        
-        print(f"☁️ Uploading to Supabase bucket: {BUCKET_NAME}...")
-        # Uploading to the 'vectorstore' folder inside the bucket
-        storage.upload_file("vectorstore/index.faiss", "vectorstore/index.faiss", BUCKET_NAME)
-        storage.upload_file("vectorstore/index.pkl", "vectorstore/index.pkl", BUCKET_NAME)
-        
-        print("\n✅ Success! Website ingested and Supabase vector store updated.")
-    except Exception as e:
-        print(f"\n❌ Supabase Upload Failed: {e}")
-        print("Check if 'vectorstore-bucket' exists in your Supabase Storage dashboard.")
+        for i in keep:
+            text = store.text(i)
+            writer.add(text, store.metadata(i))
+            sparse.add(text)
+        kept_vectors = np.asarray(vectors[keep], dtype=np.float32)
+        builder.add(kept_vectors)
+        index, index_params = builder.finish()
+    except BaseException:
+        writer.abort()
+        raise
+
+    if index_type != "flat":
+        index_params["report"] = recall_report(kept_vectors, index)
+    save_index(folder, index, index_params)
+    writer.close()
+    sparse.save(folder)
+    save_vectors(folder, kept_vectors)
+    for url in urls:
+        manifest["pages"].pop(url, None)
+    save_manifest(folder, manifest)
+    print(f"🗑️ Removed {len(store) - len(keep)} chunks from {len(urls)} pages ({len(keep)} left)")
+
+    upload_artifacts(folder, manifest)
+
 
 if __name__ == "__main__":
-    ingest_website()
\ No newline at end of file
+    if "--delete" in sys.argv:
+        delete_pages(sys.argv[sys.argv.index("--delete") + 1:])
+    else:
+        ingest_website(incremental="--full" not in sys.argv)
\ No newline at end of file
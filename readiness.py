@@ -0,0 +1,120 @@
+import time
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Vector store lifecycle: starting -> loading -> ready, or loading -> failed -> loading (retry).
+# Once ready it stays ready: a failed refresh keeps serving the previous version.
+STARTING = "starting"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class NotReadyError(Exception):
+    """Raised before any retrieval work when the vector store isn't serving yet"""
+
+    def __init__(self, state, retry_after):
+        super().__init__(f"Knowledge base is {state}, try again in {retry_after}s")
+        self.state = state
+        self.retry_after = retry_after
+
+
+class Readiness:
+    """
+    Thread-safe state of the vector store. The loader thread moves it along;
+    request coroutines check it, or wait (bounded) to become ready.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = []
+        self.state = STARTING
+        self.since = time.time()
+        self.attempts = 0
+        self.error = None
+        self.next_retry_at = None
+
+    @property
+    def ready(self):
+        return self.state == READY
+
+    def loading(self):
+        with self._lock:
+            if self.state != READY:
+                self._set(LOADING)
+            self.attempts += 1
+            self.next_retry_at = None
+
+    def failed(self, error, retry_in):
+        with self._lock:
+            self.error = str(error)
+            if self.state != READY:
+                self._set(FAILED)
+                self.next_retry_at = time.time() + retry_in
+
+    def succeeded(self):
+        with self._lock:
+            self.error = None
+            self.next_retry_at = None
+            self._set(READY)
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def _set(self, state):
+        if state != self.state:
+            logger.info(f"🚦 Vector store {self.state} -> {state}")
+            self.state = state
+            self.since = time.time()
+
+    def retry_after(self, default=5):
+        """Seconds a client should back off for (Retry-After)"""
+        if self.state == FAILED and self.next_retry_at:
+            return max(1, int(self.next_retry_at - time.time()) + 1)
+        return default
+
+    async def wait(self, timeout):
+        """
+        Wait up to timeout seconds for READY. Fails fast (NotReadyError) when the
+        last load failed or timeout is 0, so requests never start retrieval cold.
+        """
+        if self.ready:
+            return
+        if self.state == FAILED or timeout <= 0:
+            raise NotReadyError(self.state, self.retry_after())
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self.ready:
+                return
+            self._waiters.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise NotReadyError(self.state, self.retry_after())
+        finally:
+            with self._lock:
+                if (loop, future) in self._waiters:
+                    self._waiters.remove((loop, future))
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "since": round(time.time() - self.since, 1),
+                "attempts": self.attempts,
+                "error": self.error,
+                "retry_in": round(self.next_retry_at - time.time(), 1) if self.next_retry_at else None,
+            }
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+readiness = Readiness()
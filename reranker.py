@@ -0,0 +1,162 @@
+import os
+import time
+import threading
+import logging
+import numpy as np
+from embedding_engine import embed_matrix
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+RERANK_MODE = os.getenv("RERANK_MODE", "off")                 # off | cross_encoder | mmr
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_FACTOR = int(os.getenv("RERANK_FACTOR", "3"))           # over-fetch k * factor candidates
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))  # past this, keep the retrieval order
+RERANK_TOKEN_BUDGET = int(os.getenv("RERANK_TOKEN_BUDGET", "1500"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))             # 1.0 = relevance only
+
+RERANK_MODES = ("off", "cross_encoder", "mmr")
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token for English)"""
+    return len(text) // 4 + 1
+
+
+def within_token_budget(items, texts, k, budget):
+    """Keep items in order while the running token total fits; always keeps the first"""
+    kept, used = [], 0
+    for item, text in zip(items, texts):
+        if len(kept) == k:
+            break
+        tokens = estimate_tokens(text)
+        if kept and used + tokens > budget:
+            break
+        kept.append(item)
+        used += tokens
+    return kept
+
+
+def mmr_order(query_vector, doc_vectors, k, lam=MMR_LAMBDA):
+    """Maximal marginal relevance over unit vectors; returns row order of the picks"""
+    relevance = doc_vectors @ query_vector
+    similarity = doc_vectors @ doc_vectors.T
+    picked = [int(np.argmax(relevance))]
+    remaining = set(range(len(doc_vectors))) - set(picked)
+    while remaining and len(picked) < k:
+        rows = np.fromiter(remaining, dtype=np.int64)
+        redundancy = similarity[np.ix_(rows, picked)].max(axis=1)
+        best = int(rows[np.argmax(lam * relevance[rows] - (1 - lam) * redundancy)])
+        picked.append(best)
+        remaining.discard(best)
+    return picked
+
+
+def _unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class Reranker:
+    """
+    Optional second stage between retrieval and the prompt. The cross-encoder is
+    loaded in the background on first use; until it is ready, and whenever scoring
+    runs past the time budget, results keep their retrieval order.
+    """
+
+    def __init__(self, mode=RERANK_MODE, model_name=RERANK_MODEL, budget_ms=RERANK_BUDGET_MS):
+        if mode not in RERANK_MODES:
+            raise ValueError(f"Unknown rerank mode {mode!r}, expected one of {RERANK_MODES}")
+        self.mode = mode
+        self.model_name = model_name
+        self.budget = budget_ms / 1000
+        self._model = None
+        self._loading = False
+        self._lock = threading.Lock()
+        self.reranked = 0
+        self.fallbacks = 0
+
+    @property
+    def enabled(self):
+        return self.mode != "off"
+
+    def fetch_k(self, k):
+        """How many candidates retrieval should return for a final top-k"""
+        return k * RERANK_FACTOR if self.enabled else k
+
+    def _load(self):
+        try:
+            from sentence_transformers import CrossEncoder
+            model = CrossEncoder(self.model_name, device="cpu")
+            self._model = model
+            logger.info(f"✅ Reranker loaded ({self.model_name})")
+        except Exception as e:
+            logger.error(f"❌ Reranker failed to load, keeping retrieval order: {e}")
+            self.mode = "off"
+
+    def _get_model(self):
+        """The cross-encoder if loaded, else None (starting the load once)"""
+        if self._model is None:
+            with self._lock:
+                if not self._loading:
+                    self._loading = True
+                    threading.Thread(target=self._load, daemon=True).start()
+        return self._model
+
+    def _cross_encoder_order(self, query, texts, deadline):
+        model = self._get_model()
+        if model is None:
+            return None
+        scores = []
+        for start in range(0, len(texts), RERANK_BATCH_SIZE):
+            if time.perf_counter() > deadline:
+                return None
+            batch = [(query, text) for text in texts[start:start + RERANK_BATCH_SIZE]]
+            scores.extend(model.predict(batch, batch_size=len(batch), show_progress_bar=False))
+        return list(np.argsort(-np.asarray(scores), kind="stable"))
+
+    def _mmr_order(self, query_vector, texts, embeddings, k, deadline):
+        doc_vectors = _unit(embed_matrix(embeddings, texts))
+        if time.perf_counter() > deadline:
+            return None
+        return mmr_order(_unit(query_vector), doc_vectors, k)
+
+    def rerank(self, query, doc_ids, docs, k, embeddings=None, query_vector=None):
+        """Best k of the candidates under the token budget; returns (doc_ids, docs)"""
+        texts = [doc.page_content for doc in docs]
+        order = None
+
+        if self.enabled and len(docs) > 1:
+            started = time.perf_counter()
+            deadline = started + self.budget
+            try:
+                if self.mode == "cross_encoder":
+                    order = self._cross_encoder_order(query, texts, deadline)
+                else:
+                    order = self._mmr_order(query_vector, texts, embeddings, k, deadline)
+            except Exception as e:
+                logger.warning(f"⚠️ Rerank failed, keeping retrieval order: {e}")
+
+            elapsed = (time.perf_counter() - started) * 1000
+            if order is None or time.perf_counter() > deadline:
+                order = None
+                self.fallbacks += 1
+                logger.info(f"⏱️ Rerank ({self.mode}) skipped after {elapsed:.0f} ms, using retrieval order")
+            else:
+                self.reranked += 1
+                logger.info(f"🎯 Reranked {len(docs)} candidates ({self.mode}) in {elapsed:.0f} ms")
+
+        if order is None:
+            order = range(len(docs))
+        kept = within_token_budget(list(order), [texts[i] for i in order], k, RERANK_TOKEN_BUDGET)
+        return [doc_ids[i] for i in kept], [docs[i] for i in kept]
+
+    def stats(self):
+        return {"mode": self.mode, "loaded": self._model is not None,
+                "reranked": self.reranked, "fallbacks": self.fallbacks}
+
+
+# Shared instance used by rag_engine
+reranker = Reranker()
@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "512"))
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+
+
+class SemanticAnswerCache:
+    """
+    Recent (query embedding, retrieved doc ids, answer) entries in a NumPy matrix.
+    A lookup hits when cosine similarity >= threshold AND the same context was retrieved.
+    Full cache evicts the least recently used slot; entries expire after ttl seconds.
+    """
+
+    def __init__(
+        self,
+        maxsize=SEMANTIC_CACHE_SIZE,
+        threshold=SEMANTIC_CACHE_THRESHOLD,
+        ttl=SEMANTIC_CACHE_TTL,
+        enabled=SEMANTIC_CACHE_ENABLED
+    ):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._vectors = None          # (maxsize, dim) unit vectors, allocated on first add
+        self._entries = [None] * maxsize   # slot -> (doc_ids, answer, created_at)
+        self._last_used = np.zeros(maxsize)
+        self._count = 0
+        self.hits = 0
+        self.misses = 0
+        # Bumped on clear() so answers computed against an old index are dropped
+        self.generation = 0
+
+    @staticmethod
+    def _unit(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding, doc_ids):
+        """Return a cached answer for a near-duplicate query with the same context"""
+        if not self.enabled:
+            return None
+
+        query = self._unit(embedding)
+        doc_ids = tuple(doc_ids)
+        now = time.time()
+
+        with self._lock:
+            if self._count == 0:
+                self.misses += 1
+                return None
+
+            sims = self._vectors[:self._count] @ query
+            for slot in np.argsort(-sims):
+                if sims[slot] < self.threshold:
+                    break
+                cached_ids, answer, created_at = self._entries[slot]
+                if now - created_at > self.ttl or cached_ids != doc_ids:
+                    continue
+                self._last_used[slot] = now
+                self.hits += 1
+                logger.info(f"🎯 Semantic cache hit (cosine={sims[slot]:.3f})")
+                return answer
+
+            self.misses += 1
+            return None
+
+    def add(self, embedding, doc_ids, answer, generation=None):
+        """Cache an answer; generation (read before retrieval) drops answers from a swapped-out index"""
+        if not self.enabled:
+            return
+
+        vector = self._unit(embedding)
+        now = time.time()
+
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if self._vectors is None:
+                self._vectors = np.zeros((self.maxsize, vector.shape[0]), dtype=np.float32)
+
+            if self._count < self.maxsize:
+                slot = self._count
+                self._count += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+
+            self._vectors[slot] = vector
+            self._entries[slot] = (tuple(doc_ids), answer, now)
+            self._last_used[slot] = now
+
+    def clear(self):
+        """Drop every entry; doc ids are only meaningful for the index they came from"""
+        with self._lock:
+            self._entries = [None] * self.maxsize
+            self._last_used[:] = 0
+            self._count = 0
+            self.generation += 1
+        logger.info("🧹 Semantic answer cache cleared")
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "size": self._count,
+            }
+
+
+semantic_cache = SemanticAnswerCache()
@@ -0,0 +1,157 @@
+import os
+import re
+import json
+from array import array
+from collections import Counter
+import numpy as np
+
+# BM25 inverted index over the chunk store rows (row i = FAISS row i).
+# On-disk layout, all mmap-readable like the chunk store:
+#   bm25_terms.json     {"terms": [...], "avgdl": float}; term id = position in the list
+#   bm25_offsets.npy    int64, n_terms + 1; postings of term t = [offsets[t]:offsets[t + 1]]
+#   bm25_docs.npy       int32 chunk rows, ascending within each posting list
+#   bm25_tfs.npy        uint16 term frequency per posting
+#   bm25_doclens.npy    int32 token count per chunk
+TERMS_FILE = "bm25_terms.json"
+POSTING_OFFSETS_FILE = "bm25_offsets.npy"
+POSTING_DOCS_FILE = "bm25_docs.npy"
+POSTING_TFS_FILE = "bm25_tfs.npy"
+DOCLENS_FILE = "bm25_doclens.npy"
+SPARSE_FILES = [TERMS_FILE, POSTING_OFFSETS_FILE, POSTING_DOCS_FILE, POSTING_TFS_FILE, DOCLENS_FILE]
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+WORD = re.compile(r"\w+")
+EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+PHONE = re.compile(r"\+?\d[\d\s().-]{5,}\d")
+STOPWORDS = frozenset(
+    "a an and are as at be by do does for from how i in is it of on or our that the "
+    "this to was what when where which who why with you your".split()
+)
+
+
+def tokenize(text):
+    """Lowercased words, plus whole emails and digit-only phone numbers as single terms"""
+    text = text.lower()
+    tokens = [t for t in WORD.findall(text) if t not in STOPWORDS]
+    tokens += EMAIL.findall(text)
+    tokens += [digits for digits in (re.sub(r"\D", "", p) for p in PHONE.findall(text)) if len(digits) >= 7]
+    return tokens
+
+
+class BM25Builder:
+    """Accumulates posting lists chunk by chunk, in chunk store row order"""
+
+    def __init__(self):
+        self._vocab = {}
+        self._docs = []
+        self._tfs = []
+        self._doclens = array("i")
+
+    def __len__(self):
+        return len(self._doclens)
+
+    def add(self, text):
+        row = len(self._doclens)
+        counts = Counter(tokenize(text))
+        self._doclens.append(sum(counts.values()))
+        for term, tf in counts.items():
+            term_id = self._vocab.setdefault(term, len(self._vocab))
+            if term_id == len(self._docs):
+                self._docs.append(array("i"))
+                self._tfs.append(array("H"))
+            self._docs[term_id].append(row)
+            self._tfs[term_id].append(min(tf, 0xFFFF))
+
+    def save(self, folder):
+        """Write every file as *.tmp, then rename, so an open BM25Index is never disturbed"""
+        offsets = np.zeros(len(self._docs) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(docs) for docs in self._docs])
+        columns = (
+            (POSTING_OFFSETS_FILE, offsets),
+            (POSTING_DOCS_FILE, np.frombuffer(b"".join(d.tobytes() for d in self._docs), dtype=np.int32)),
+            (POSTING_TFS_FILE, np.frombuffer(b"".join(t.tobytes() for t in self._tfs), dtype=np.uint16)),
+            (DOCLENS_FILE, np.frombuffer(self._doclens.tobytes(), dtype=np.int32)),
+        )
+        for name, column in columns:
+            with open(os.path.join(folder, f"{name}.tmp"), "wb") as f:
+                np.save(f, column)
+
+        avgdl = sum(self._doclens) / len(self._doclens) if self._doclens else 0.0
+        with open(os.path.join(folder, f"{TERMS_FILE}.tmp"), "w", encoding="utf-8") as f:
+            json.dump({"terms": list(self._vocab), "avgdl": avgdl}, f, ensure_ascii=False)
+
+        for name in SPARSE_FILES:
+            os.replace(os.path.join(folder, f"{name}.tmp"), os.path.join(folder, name))
+
+
+def write_sparse_index(folder, texts):
+    builder = BM25Builder()
+    for text in texts:
+        builder.add(text)
+    builder.save(folder)
+
+
+def has_sparse_index(folder):
+    return all(os.path.exists(os.path.join(folder, name)) for name in SPARSE_FILES)
+
+
+class BM25Index:
+    """Read-only BM25 scorer over the mmapped posting lists"""
+
+    def __init__(self, folder, k1=BM25_K1, b=BM25_B):
+        with open(os.path.join(folder, TERMS_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.terms = {term: i for i, term in enumerate(meta["terms"])}
+        self.offsets = np.load(os.path.join(folder, POSTING_OFFSETS_FILE), mmap_mode="r")
+        self.docs = np.load(os.path.join(folder, POSTING_DOCS_FILE), mmap_mode="r")
+        self.tfs = np.load(os.path.join(folder, POSTING_TFS_FILE), mmap_mode="r")
+        doclens = np.load(os.path.join(folder, DOCLENS_FILE))
+        self.n_docs = len(doclens)
+        self.k1 = k1
+
+        # Per-chunk length normalisation and per-term idf don't depend on the query
+        avgdl = meta["avgdl"] or 1.0
+        self._norm = (k1 * (1 - b + b * doclens / avgdl)).astype(np.float32)
+        df = np.diff(self.offsets).astype(np.float64)
+        self._idf = np.log(1 + (self.n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    def __len__(self):
+        return self.n_docs
+
+    def search(self, query, k, rows=None):
+        """Top-k (row, score) pairs, best first; empty when no query term is indexed.
+        rows optionally restricts the result to those chunk rows."""
+        term_ids = {self.terms[t] for t in tokenize(query) if t in self.terms}
+        if not term_ids or k <= 0:
+            return []
+
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.docs[start:end]
+            tfs = self.tfs[start:end].astype(np.float32)
+            # Rows are unique within a posting list, so fancy-index += is safe
+            scores[docs] += self._idf[term_id] * tfs * (self.k1 + 1) / (tfs + self._norm[docs])
+
+        if rows is not None:
+            allowed = np.zeros(self.n_docs, dtype=bool)
+            allowed[rows] = True
+            scores[~allowed] = 0
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(row), float(scores[row])) for row in ranked]
+
+
+def rrf_fuse(ranked_lists, k, c=RRF_K):
+    """Reciprocal rank fusion: score(id) = sum over lists of 1 / (c + rank)"""
+    scores = {}
+    for ranked in ranked_lists:
+        for rank, doc_id in enumerate(ranked, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (c + rank)
+    return sorted(scores, key=lambda doc_id: -scores[doc_id])[:k]
@@ -0,0 +1,153 @@
+import os
+import base64
+import logging
+import tempfile
+from contextlib import contextmanager
+from urllib.parse import urljoin
+import httpx
+import zstandard
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_exponential, before_sleep_log
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+UPLOAD_CHUNK_SIZE = 6 * 1024 * 1024   # Supabase's resumable endpoint requires 6 MB parts
+RESUMABLE_THRESHOLD = int(os.getenv("RESUMABLE_UPLOAD_THRESHOLD", str(UPLOAD_CHUNK_SIZE)))   # bytes; larger files go through TUS
+UPLOAD_RETRIES = int(os.getenv("UPLOAD_RETRIES", "5"))   # attempts per request / part
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))   # files uploaded in parallel
+UPLOAD_COMPRESSION = os.getenv("UPLOAD_COMPRESSION", "none").lower()   # none | zstd
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "3"))
+COMPRESS_MIN_BYTES = 64 * 1024   # smaller artifacts aren't worth a decompress on download
+
+TUS_VERSION = "1.0.0"
+RETRY_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}   # 409 = TUS offset conflict, re-synced on retry
+
+
+def is_transient(error):
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRY_STATUS
+    return isinstance(error, httpx.TransportError)
+
+
+def retrying():
+    """Exponential backoff for network errors and retryable statuses"""
+    return Retrying(
+        retry=retry_if_exception(is_transient),
+        stop=stop_after_attempt(UPLOAD_RETRIES),
+        wait=wait_exponential(multiplier=0.5, max=30),
+        before_sleep=before_sleep_log(logger, logging.WARNING),
+        reraise=True,
+    )
+
+
+def compressed_name(remote_path, compression):
+    return f"{remote_path}.zst" if compression == "zstd" else remote_path
+
+
+def decompressor(compression):
+    """Streaming decompressor for a stored artifact, or None when stored as-is"""
+    if compression == "zstd":
+        return zstandard.ZstdDecompressor().decompressobj()
+    if compression:
+        raise ValueError(f"Unknown compression: {compression}")
+    return None
+
+
+@contextmanager
+def zstd_copy(local_path, level=ZSTD_LEVEL):
+    """Temporary zstd-compressed copy of local_path, written in streaming fashion"""
+    fd, tmp = tempfile.mkstemp(suffix=".zst", dir=os.path.dirname(local_path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as dst, open(local_path, "rb") as src:
+            zstandard.ZstdCompressor(level=level).copy_stream(src, dst)
+        yield tmp
+    finally:
+        os.remove(tmp)
+
+
+class StorageUploader:
+    """
+    Streaming uploads against a Supabase Storage API root (".../storage/v1").
+    Small files go up in one streamed request; larger ones use the TUS resumable
+    endpoint in UPLOAD_CHUNK_SIZE parts, so memory stays at one part per upload and
+    a dropped connection resumes from the server's offset instead of byte 0.
+    Pass an httpx client (e.g. with a MockTransport) to test without Supabase.
+    """
+
+    def __init__(self, storage_url, api_key, client=None):
+        self.storage_url = storage_url.rstrip("/")
+        self.headers = {"authorization": f"Bearer {api_key}", "apikey": api_key}
+        self.client = client or httpx.Client(timeout=httpx.Timeout(60.0, connect=10.0))
+
+    def upload(self, local_path, remote_path, bucket, compression=None):
+        """Upload local_path (compressed first if asked); raises once retries are exhausted"""
+        if compression == "zstd":
+            with zstd_copy(local_path) as packed:
+                self._upload(packed, remote_path, bucket, "application/zstd")
+                return os.path.getsize(packed)
+        self._upload(local_path, remote_path, bucket, "application/octet-stream")
+        return os.path.getsize(local_path)
+
+    def _upload(self, path, remote_path, bucket, content_type):
+        if os.path.getsize(path) > RESUMABLE_THRESHOLD:
+            self._upload_resumable(path, remote_path, bucket, content_type)
+        else:
+            self._upload_simple(path, remote_path, bucket, content_type)
+
+    def _upload_simple(self, path, remote_path, bucket, content_type):
+        url = f"{self.storage_url}/object/{bucket}/{remote_path}"
+        headers = {**self.headers, "content-type": content_type, "x-upsert": "true"}
+        for attempt in retrying():
+            with attempt:
+                # httpx streams file objects in small blocks; reopened so a retry starts clean
+                with open(path, "rb") as f:
+                    self.client.post(url, content=f, headers=headers).raise_for_status()
+
+    def _upload_resumable(self, path, remote_path, bucket, content_type):
+        size = os.path.getsize(path)
+        location = self._create(remote_path, bucket, size, content_type)
+        offset = 0
+        with open(path, "rb") as f:
+            while offset < size:
+                for attempt in retrying():
+                    with attempt:
+                        if attempt.retry_state.attempt_number > 1:
+                            offset = self._offset(location)
+                        if offset < size:
+                            offset = self._patch(location, f, offset)
+                logger.info(f"⬆️  {remote_path}: {offset:,}/{size:,} bytes")
+
+    def _create(self, remote_path, bucket, size, content_type):
+        metadata = {"bucketName": bucket, "objectName": remote_path, "contentType": content_type, "cacheControl": "3600"}
+        headers = {
+            **self.headers,
+            "tus-resumable": TUS_VERSION,
+            "upload-length": str(size),
+            "upload-metadata": ",".join(f"{key} {base64.b64encode(value.encode()).decode()}" for key, value in metadata.items()),
+            "x-upsert": "true",
+        }
+        for attempt in retrying():
+            with attempt:
+                response = self.client.post(f"{self.storage_url}/upload/resumable", headers=headers)
+                response.raise_for_status()
+        return urljoin(f"{self.storage_url}/", response.headers["location"])
+
+    def _offset(self, location):
+        """Bytes the server already has (after a failed part)"""
+        response = self.client.head(location, headers={**self.headers, "tus-resumable": TUS_VERSION})
+        response.raise_for_status()
+        return int(response.headers["upload-offset"])
+
+    def _patch(self, location, f, offset):
+        f.seek(offset)
+        part = f.read(UPLOAD_CHUNK_SIZE)
+        headers = {
+            **self.headers,
+            "tus-resumable": TUS_VERSION,
+            "upload-offset": str(offset),
+            "content-type": "application/offset+octet-stream",
+        }
+        response = self.client.patch(location, content=part, headers=headers)
+        response.raise_for_status()
+        return int(response.headers["upload-offset"])
+
@@ -0,0 +1,100 @@
+import os
+import json
+import secrets
+import logging
+import tempfile
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from ingest_manifest import file_hash
+from artifact_cache import sha256_file
+from storage_upload import UPLOAD_COMPRESSION, UPLOAD_CONCURRENCY, COMPRESS_MIN_BYTES, compressed_name
+
+logger = logging.getLogger(__name__)
+
+# Versioned bucket layout:
+#   <remote>/versions/<version>/<file>   immutable artifacts of one ingest
+#   <remote>/current.json                {"version", "created_at", "files": {name: {"path", "hash", "sha256", "size", "compression"?}}}
+# hash/sha256/size always describe the uncompressed file; "compression": "zstd" marks a .zst object.
+# current.json is uploaded last, so readers only ever see complete versions.
+# Unchanged files keep pointing at the version that first uploaded them.
+CURRENT_FILE = "current.json"
+VERSIONS_FOLDER = "versions"
+
+
+def new_version():
+    """Sortable, unique version name: UTC timestamp plus a random suffix"""
+    return f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}-{secrets.token_hex(3)}"
+
+
+def fetch_current(storage, bucket, remote_folder):
+    """
+    Parsed current.json from the bucket, or None when there is none (the flat
+    pre-versioning layout). Failing to read one that exists raises, so a transient
+    error is retried instead of being mistaken for the legacy layout.
+    """
+    path = f"{remote_folder}/{CURRENT_FILE}"
+    if not storage.exists(path, bucket):
+        return None
+    fd, tmp = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    try:
+        if not storage.download_file(path, tmp, bucket):
+            raise Exception(f"Reading {path} failed")
+        with open(tmp, "r", encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.remove(tmp)
+
+
+def upload_version(storage, bucket, remote_folder, folder, filenames):
+    """
+    Upload the local artifacts that differ from the published version, then publish
+    a new current.json. Returns the new manifest, or the current one if nothing changed.
+    """
+    current = fetch_current(storage, bucket, remote_folder) or {"files": {}}
+    version = new_version()
+    files = {}
+    changed = []
+
+    for name in filenames:
+        path = os.path.join(folder, name)
+        if not os.path.exists(path):
+            continue
+        digest = file_hash(path)
+        previous = current["files"].get(name)
+        if previous and previous.get("hash") == digest:
+            files[name] = previous
+            continue
+
+        size = os.path.getsize(path)
+        compression = "zstd" if UPLOAD_COMPRESSION == "zstd" and size >= COMPRESS_MIN_BYTES else None
+        remote_path = compressed_name(f"{remote_folder}/{VERSIONS_FOLDER}/{version}/{name}", compression)
+        files[name] = {"path": remote_path, "hash": digest, "sha256": sha256_file(path), "size": size}
+        if compression:
+            files[name]["compression"] = compression
+        changed.append(name)
+
+    # Changed files go up in parallel; each upload streams with bounded memory
+    with ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY, thread_name_prefix="upload") as pool:
+        results = {
+            name: pool.submit(storage.upload_file, os.path.join(folder, name), files[name]["path"], bucket, files[name].get("compression"))
+            for name in changed
+        }
+    failed = [name for name, future in results.items() if not future.result()]
+    if failed:
+        raise Exception(f"Upload failed for {', '.join(failed)}")
+    uploaded = len(changed)
+
+    if uploaded == 0 and files.keys() == current["files"].keys():
+        logger.info(f"✅ Nothing changed since version {current.get('version')}")
+        return current
+
+    manifest = {"version": version, "created_at": datetime.now(timezone.utc).isoformat(), "files": files}
+    local_manifest = os.path.join(folder, CURRENT_FILE)
+    with open(local_manifest, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    if not storage.upload_file(local_manifest, f"{remote_folder}/{CURRENT_FILE}", bucket):
+        raise Exception("Publishing current.json failed")
+
+    logger.info(f"📦 Published version {version} ({uploaded}/{len(files)} files uploaded)")
+    return manifest
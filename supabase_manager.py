@@ -1,6 +1,9 @@
 import os
+import hashlib
 import logging
+import httpx
 from supabase import create_client, Client
+from storage_upload import StorageUploader, decompressor, retrying
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -15,6 +18,7 @@ class SupabaseStorageManager:
             raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set")
         
         self.client: Client = create_client(supabase_url, supabase_key)
+        self.uploader = StorageUploader(f"{supabase_url.rstrip('/')}/storage/v1", supabase_key)
         logger.info("✅ Supabase client initialized")
     
     def download_file(self, remote_path: str, local_path: str, bucket_name: str) -> bool:
@@ -37,28 +41,60 @@ class SupabaseStorageManager:
             logger.error(f"❌ Download failed for {remote_path}: {str(e)}")
             return False
     
-    def upload_file(self, local_path: str, remote_path: str, bucket_name: str) -> bool:
-        """Upload file to Supabase Storage"""
+    def download_stream(self, remote_path: str, local_path: str, bucket_name: str,
+                        chunk_size: int = 1 << 20, compression: str = None) -> dict:
+        """
+        Stream a file to local_path in chunks (never holding it all in memory),
+        decompressing stored .zst artifacts on the fly. Retried with backoff.
+        Returns {"sha256", "size"} of what was written; raises on failure.
+        """
+        for attempt in retrying():
+            with attempt:
+                return self._download_stream(remote_path, local_path, bucket_name, chunk_size, compression)
+
+    def _download_stream(self, remote_path, local_path, bucket_name, chunk_size, compression):
+        signed = self.client.storage.from_(bucket_name).create_signed_url(remote_path, 300)
+        url = signed.get("signedURL") or signed.get("signedUrl")
+        if url.startswith("/"):
+            # Older storage clients return the path only
+            url = f"{os.getenv('SUPABASE_URL').rstrip('/')}/storage/v1{url}"
+        unpack = decompressor(compression)
+        digest = hashlib.sha256()
+        size = 0
+
+        with httpx.stream("GET", url, timeout=60.0, follow_redirects=True) as response:
+            response.raise_for_status()
+            with open(local_path, "wb") as f:
+                for chunk in response.iter_bytes(chunk_size):
+                    if unpack:
+                        chunk = unpack.decompress(chunk)
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+
+        logger.info(f"✅ Streamed {remote_path}: {size:,} bytes")
+        return {"sha256": digest.hexdigest(), "size": size}
+    
+    def upload_file(self, local_path: str, remote_path: str, bucket_name: str, compression: str = None) -> bool:
+        """Upload file to Supabase Storage (streamed; resumable for large files, upsert)"""
         try:
             logger.info(f"⬆️  Uploading {local_path} to {remote_path}...")
             
-            with open(local_path, 'rb') as f:
-                file_content = f.read()
-            
-            # Upload with upsert to overwrite if exists
-            self.client.storage.from_(bucket_name).upload(
-                path=remote_path,
-                file=file_content,
-                file_options={"content-type": "application/octet-stream", "upsert": "true"}
-            )
+            stored = self.uploader.upload(local_path, remote_path, bucket_name, compression)
             
-            logger.info(f"✅ Uploaded {local_path}")
+            logger.info(f"✅ Uploaded {local_path} ({stored:,} bytes stored)")
             return True
             
         except Exception as e:
             logger.error(f"❌ Upload failed for {local_path}: {str(e)}")
             return False
     
+    def exists(self, remote_path: str, bucket_name: str) -> bool:
+        """Whether remote_path exists; unlike list_files, a failed listing raises"""
+        folder, _, name = remote_path.rpartition("/")
+        files = self.client.storage.from_(bucket_name).list(folder, {"search": name})
+        return any(f.get("name") == name for f in files)
+
     def list_files(self, bucket_name: str, folder: str = "") -> list:
         """List files in a bucket folder"""
         try:
@@ -0,0 +1,112 @@
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import database
+import chat_writer as chat_writer_module
+from chat_writer import ChatWriter
+from models import Chat
+
+
+def make_chat(i):
+    return Chat(
+        session_id="session-1",
+        user_id="user-1",
+        question=f"question {i}",
+        answer=f"answer {i}",
+        created_at=datetime(2024, 1, 1) + timedelta(seconds=i),
+    )
+
+
+def run_with_db(tmp_path, monkeypatch, test):
+    """Run test(writer) against a fresh SQLite database"""
+    async def main():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'chats.db'}")
+        async with engine.begin() as connection:
+            await connection.run_sync(database.Base.metadata.create_all)
+        monkeypatch.setattr(database, "AsyncSessionLocal", async_sessionmaker(engine, expire_on_commit=False))
+
+        # Only explicit flush() calls write
+        writer = ChatWriter(batch_size=50, interval_ms=60_000, write_behind=True)
+        writer.start()
+        try:
+            await test(writer)
+        finally:
+            await writer.stop()
+            await engine.dispose()
+
+    asyncio.run(main())
+
+
+async def saved_rows():
+    async with database.AsyncSessionLocal() as session:
+        return (await session.execute(select(Chat).order_by(Chat.id))).scalars().all()
+
+
+def test_transient_error_keeps_rows_queued(tmp_path, monkeypatch):
+    monkeypatch.setattr(chat_writer_module, "CHAT_WRITE_RETRIES", 1)
+
+    async def test(writer):
+        chats = [make_chat(i) for i in range(3)]
+        for chat in chats:
+            assert await writer.put(chat)
+
+        real_insert = writer._insert
+
+        async def unreachable(batch):
+            raise OperationalError("INSERT INTO chats_info", {}, ConnectionError("connection reset"))
+
+        writer._insert = unreachable
+        assert await writer.flush() is False
+        assert writer.stats()["queued"] == 3
+        assert writer.pending("session-1") == chats
+        assert await saved_rows() == []
+
+        writer._insert = real_insert
+        assert await writer.flush() is True
+        assert writer.stats() == {"queued": 0, "flushes": 1, "written": 3, "dropped": 0}
+        rows = await saved_rows()
+        assert [row.question for row in rows] == [chat.question for chat in chats]
+        assert [chat.id for chat in chats] == [row.id for row in rows]
+
+    run_with_db(tmp_path, monkeypatch, test)
+
+
+def test_transient_error_is_retried_within_flush(tmp_path, monkeypatch):
+    async def test(writer):
+        await writer.put(make_chat(0))
+        real_insert = writer._insert
+        calls = []
+
+        async def flaky(batch):
+            calls.append(len(batch))
+            if len(calls) == 1:
+                raise OperationalError("INSERT INTO chats_info", {}, ConnectionError("connection reset"))
+            await real_insert(batch)
+
+        writer._insert = flaky
+        assert await writer.flush() is True
+        assert calls == [1, 1]
+        assert len(await saved_rows()) == 1
+
+    run_with_db(tmp_path, monkeypatch, test)
+
+
+def test_permanent_error_drops_only_the_bad_row(tmp_path, monkeypatch):
+    async def test(writer):
+        good = [make_chat(0), make_chat(2)]
+        bad = make_chat(1)
+        bad.question = None   # NOT NULL violation: not transient, never succeeds
+
+        for chat in (good[0], bad, good[1]):
+            await writer.put(chat)
+
+        assert await writer.flush() is True
+        assert writer.stats() == {"queued": 0, "flushes": 1, "written": 2, "dropped": 1}
+        rows = await saved_rows()
+        assert [row.question for row in rows] == ["question 0", "question 2"]
+        assert bad.id is None and all(chat.id is not None for chat in good)
+
+    run_with_db(tmp_path, monkeypatch, test)
+
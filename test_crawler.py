@@ -0,0 +1,113 @@
+import os
+import random
+import asyncio
+from collections import Counter
+import httpx
+import numpy as np
+from crawler import Crawler
+from ingest_manifest import VECTORS_FILE
+from ingest_pipeline import IngestPipeline, PreviousBuild
+from test_ingest_pipeline import FakeEmbeddings
+
+BASE = "https://site.test/"
+ROBOTS = "User-agent: *\nDisallow: /private\n"
+# path -> linked paths
+SITE = {
+    "/": ["/b", "/a", "/private", "https://elsewhere.test/x"],
+    "/a": ["/c", "/a/deep", "/"],
+    "/b": ["/c", "/a"],
+    "/c": ["/d"],
+    "/a/deep": [],
+    "/d": [],
+    "/private": ["/secret"],
+}
+
+
+class FixtureSite:
+    """Serves SITE through httpx.MockTransport with ETags, 304s and random latency"""
+
+    def __init__(self, seed=0):
+        self.requests = Counter()
+        self.not_modified = 0
+        self.random = random.Random(seed)
+
+    async def handler(self, request):
+        path = request.url.path
+        self.requests[path] += 1
+        await asyncio.sleep(self.random.random() / 100)   # responses arrive out of order
+        if path == "/robots.txt":
+            return httpx.Response(200, text=ROBOTS)
+        if path not in SITE:
+            return httpx.Response(404)
+
+        etag = f'"{path}-v1"'
+        if request.headers.get("if-none-match") == etag:
+            self.not_modified += 1
+            return httpx.Response(304, headers={"ETag": etag})
+        links = "".join(f'<a href="{link}">{link}</a>' for link in SITE[path])
+        html = f"<html><head><title>{path}</title></head><body><p>Page {path} text.</p>{links}</body></html>"
+        return httpx.Response(200, text=html, headers={"ETag": etag})
+
+
+def crawl(site, **kwargs):
+    crawler = Crawler(BASE, kwargs.pop("max_pages", 50), delay=0, transport=httpx.MockTransport(site.handler), **kwargs)
+    return asyncio.run(crawler.crawl())
+
+
+def paths(pages):
+    return [page["url"][len(BASE) - 1:] for page in pages]
+
+
+def test_robots_disallow_is_honoured():
+    site = FixtureSite()
+    pages = crawl(site)
+
+    assert "/private" not in paths(pages)
+    assert site.requests["/private"] == 0 and site.requests["/secret"] == 0
+    assert site.requests["/robots.txt"] == 1
+
+
+def test_every_url_is_fetched_once():
+    site = FixtureSite()
+    crawl(site)
+
+    assert site.requests == Counter({path: 1 for path in ["/robots.txt", "/", "/a", "/b", "/c", "/a/deep", "/d"]})
+
+
+def test_bfs_order_is_deterministic_and_respects_depth_and_max_pages():
+    # Level by level, each level sorted, whatever order the responses come back in
+    orders = [paths(crawl(FixtureSite(seed))) for seed in range(3)]
+    assert orders == [["/", "/a", "/b", "/a/deep", "/c", "/d"]] * 3
+
+    shallow = crawl(FixtureSite(), max_depth=1)
+    assert paths(shallow) == ["/", "/a", "/b"]
+    assert [page["depth"] for page in shallow] == [0, 1, 1]
+
+    assert paths(crawl(FixtureSite(), max_pages=4)) == ["/", "/a", "/b", "/a/deep"]
+
+
+def test_not_modified_pages_are_reused_without_re_embedding(tmp_path):
+    folder = str(tmp_path)
+    site = FixtureSite()
+    manifest = {"pages": {}, "artifacts": {}}
+
+    def ingest(known_pages, previous):
+        crawler = Crawler(BASE, 50, known_pages=known_pages, delay=0, transport=httpx.MockTransport(site.handler))
+        embeddings = FakeEmbeddings()
+        pipeline = IngestPipeline(crawler, embeddings, folder, "flat", manifest, previous)
+        asyncio.run(pipeline.run())
+        pipeline.writer.close()
+        np.save(os.path.join(folder, VECTORS_FILE), pipeline.all_vectors())
+        manifest["pages"] = pipeline.pages
+        return pipeline, embeddings
+
+    first, embedded = ingest(None, None)
+    assert first.counts["new"] == 6 and embedded.embedded
+
+    second, embedded = ingest(manifest["pages"], PreviousBuild.load(folder, manifest))
+    # Every page answered 304 to If-None-Match: links come from the manifest, vectors from the last build
+    assert site.not_modified == 6
+    assert second.counts == {"unchanged": 6, "changed": 0, "new": 0, "deleted": 0}
+    assert embedded.embedded == []
+    assert second.builder.ntotal == first.builder.ntotal
+    assert not second.changed
@@ -0,0 +1,95 @@
+import os
+import asyncio
+import numpy as np
+from ingest_manifest import VECTORS_FILE, content_hash
+from ingest_pipeline import IngestPipeline, PreviousBuild
+
+
+class FakeCrawler:
+    """Hands pre-built page dicts to the pipeline, like Crawler.crawl(on_page=...)"""
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    async def crawl(self, on_page=None):
+        for page in self.pages:
+            await on_page(dict(page))
+        return []
+
+
+class FakeEmbeddings:
+    """Deterministic 8-d vectors; records every text it was asked to embed"""
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [np.random.default_rng(int(content_hash(text), 16)).random(8).tolist() for text in texts]
+
+
+def page(url, content, status="ok"):
+    return {"url": url, "title": url.rsplit("/", 1)[-1], "content": content, "status": status, "links": []}
+
+
+def ingest(folder, pages, manifest, incremental=True):
+    """One ingest run, saved the way rag_ingest.ingest_website saves it"""
+    previous = PreviousBuild.load(folder, manifest) if incremental else None
+    embeddings = FakeEmbeddings()
+    pipeline = IngestPipeline(FakeCrawler(pages), embeddings, folder, "flat", manifest, previous)
+    asyncio.run(pipeline.run())
+
+    pipeline.writer.close()
+    np.save(os.path.join(folder, VECTORS_FILE), pipeline.all_vectors())
+    manifest["pages"] = pipeline.pages
+    return pipeline, embeddings
+
+
+def first_build(folder):
+    manifest = {"pages": {}, "artifacts": {}}
+    pages = [
+        page("https://example.com/a", "Alpha page. " * 10),
+        page("https://example.com/b", "Bravo page. " * 10),
+        page("https://example.com/c", "Charlie page. " * 10),
+    ]
+    pipeline, _ = ingest(folder, pages, manifest, incremental=False)
+    assert pipeline.counts == {"unchanged": 0, "changed": 0, "new": 3, "deleted": 0}
+    return manifest
+
+
+def test_incremental_ingest_reuses_unchanged_and_drops_deleted(tmp_path):
+    folder = str(tmp_path)
+    manifest = first_build(folder)
+    old_a = dict(manifest["pages"]["https://example.com/a"])
+
+    pages = [
+        page("https://example.com/a", "Alpha page. " * 10),     # unchanged
+        page("https://example.com/b", "Bravo, revised. " * 10),  # changed
+    ]                                                             # c is gone
+    pipeline, embeddings = ingest(folder, pages, manifest)
+
+    assert pipeline.counts == {"unchanged": 1, "changed": 1, "new": 0, "deleted": 1}
+    assert pipeline.changed
+    assert set(manifest["pages"]) == {"https://example.com/a", "https://example.com/b"}
+    assert manifest["pages"]["https://example.com/a"]["chunk_ids"] == old_a["chunk_ids"]
+
+    # Only the changed page was re-embedded; a's vectors came from the previous build
+    assert embeddings.embedded and all("Bravo, revised" in text for text in embeddings.embedded)
+    assert pipeline.embedded == len(embeddings.embedded)
+    assert pipeline.builder.ntotal == len(old_a["chunk_ids"]) + len(manifest["pages"]["https://example.com/b"]["chunk_ids"])
+
+
+def test_incremental_ingest_without_changes_embeds_nothing(tmp_path):
+    folder = str(tmp_path)
+    manifest = first_build(folder)
+
+    pages = [
+        page("https://example.com/a", "Alpha page. " * 10),
+        page("https://example.com/b", None, status="not_modified"),
+        page("https://example.com/c", None, status="error"),   # errors keep the last good version
+    ]
+    pipeline, embeddings = ingest(folder, pages, manifest)
+
+    assert pipeline.counts == {"unchanged": 3, "changed": 0, "new": 0, "deleted": 0}
+    assert embeddings.embedded == []
+    assert not pipeline.changed
@@ -0,0 +1,112 @@
+import os
+import base64
+import httpx
+from tenacity import wait_none
+import storage_upload
+from storage_upload import StorageUploader, decompressor
+
+STORAGE_URL = "https://fake.supabase.co/storage/v1"
+
+
+class FakeStorage:
+    """
+    Minimal Supabase Storage for httpx.MockTransport: plain object POSTs and the
+    TUS create / HEAD / PATCH calls. fail_patch_at makes the PATCH at that offset
+    keep the bytes but answer 500, like a connection that drops after the upload.
+    """
+
+    def __init__(self, fail_patch_at=None):
+        self.objects = {}
+        self.content_types = {}
+        self.uploads = {}
+        self.patches = []
+        self.fail_patch_at = fail_patch_at
+
+    def handler(self, request):
+        path = request.url.path[len("/storage/v1"):]
+        if request.method == "POST" and path.startswith("/object/"):
+            name = path[len("/object/"):]
+            self.objects[name] = request.read()
+            self.content_types[name] = request.headers["content-type"]
+            return httpx.Response(200, json={"Key": name})
+
+        if request.method == "POST" and path == "/upload/resumable":
+            metadata = dict(item.split(" ") for item in request.headers["upload-metadata"].split(","))
+            name = "/".join(
+                base64.b64decode(metadata[key]).decode() for key in ("bucketName", "objectName")
+            )
+            upload_id = str(len(self.uploads))
+            self.uploads[upload_id] = {"name": name, "length": int(request.headers["upload-length"]), "data": b""}
+            self.content_types[name] = base64.b64decode(metadata["contentType"]).decode()
+            return httpx.Response(201, headers={"location": f"/storage/v1/upload/resumable/{upload_id}"})
+
+        upload = self.uploads[path.rsplit("/", 1)[-1]]
+        if request.method == "HEAD":
+            return httpx.Response(200, headers={"upload-offset": str(len(upload["data"]))})
+
+        offset = int(request.headers["upload-offset"])
+        self.patches.append(offset)
+        if offset != len(upload["data"]):
+            return httpx.Response(409)
+        upload["data"] += request.read()
+        if len(upload["data"]) == upload["length"]:
+            self.objects[upload["name"]] = upload["data"]
+        if offset == self.fail_patch_at:
+            self.fail_patch_at = None
+            return httpx.Response(500)
+        return httpx.Response(204, headers={"upload-offset": str(len(upload["data"]))})
+
+
+def uploader_for(storage):
+    return StorageUploader(STORAGE_URL, "service-key", client=httpx.Client(transport=httpx.MockTransport(storage.handler)))
+
+
+def write_file(tmp_path, data):
+    path = tmp_path / "index.faiss"
+    path.write_bytes(data)
+    return str(path)
+
+
+def small_parts(monkeypatch, part_size):
+    monkeypatch.setattr(storage_upload, "UPLOAD_CHUNK_SIZE", part_size)
+    monkeypatch.setattr(storage_upload, "RESUMABLE_THRESHOLD", part_size)
+    monkeypatch.setattr(storage_upload, "wait_exponential", lambda **kwargs: wait_none())
+
+
+def test_small_file_is_one_plain_upload(tmp_path):
+    storage = FakeStorage()
+    data = os.urandom(10_000)
+
+    stored = uploader_for(storage).upload(write_file(tmp_path, data), "vectorstore/index.faiss", "bucket")
+
+    assert stored == len(data)
+    assert storage.objects == {"bucket/vectorstore/index.faiss": data}
+    assert storage.uploads == {}
+
+
+def test_resumable_upload_resumes_from_the_server_offset(tmp_path, monkeypatch):
+    small_parts(monkeypatch, 1024)
+    storage = FakeStorage(fail_patch_at=1024)   # the second part lands but its response is lost
+    data = os.urandom(3 * 1024 + 100)
+
+    uploader_for(storage).upload(write_file(tmp_path, data), "vectorstore/index.faiss", "bucket")
+
+    assert storage.objects["bucket/vectorstore/index.faiss"] == data
+    # After the failure the client asks for the offset and continues from 2048, not 1024 or 0
+    assert storage.patches == [0, 1024, 2048, 3072]
+
+
+def test_zstd_payload_round_trips(tmp_path, monkeypatch):
+    small_parts(monkeypatch, 4096)
+    storage = FakeStorage()
+    data = b"chunk text that compresses well " * 4000
+
+    stored = uploader_for(storage).upload(
+        write_file(tmp_path, data), "vectorstore/index.faiss.zst", "bucket", compression="zstd"
+    )
+
+    payload = storage.objects["bucket/vectorstore/index.faiss.zst"]
+    assert stored == len(payload) < len(data)
+    assert storage.content_types["bucket/vectorstore/index.faiss.zst"] == "application/zstd"
+    assert decompressor("zstd").decompress(payload) == data
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".zst")]   # temp copy removed
@@ -0,0 +1,36 @@
+import os
+import numpy as np
+import faiss
+import pytest
+from vector_index import read_index
+
+ROWS, DIM = 50_000, 384   # ~73 MB of float32 vectors
+
+
+def anonymous_mb():
+    """Heap-like (anonymous) memory of this process; mapped index files don't count"""
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Anonymous:"):
+                return int(line.split()[1]) / 1024
+    raise RuntimeError("no Anonymous line in smaps_rollup")
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/smaps_rollup"), reason="needs Linux /proc")
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_mmap_read_keeps_vectors_out_of_the_heap(tmp_path, index_type):
+    vectors = np.random.default_rng(0).random((ROWS, DIM), dtype=np.float32)
+    index = faiss.IndexFlatL2(DIM) if index_type == "flat" else faiss.IndexHNSWFlat(DIM, 8)
+    index.add(vectors if index_type == "flat" else vectors[:10_000])
+    path = str(tmp_path / "index.faiss")
+    faiss.write_index(index, path)
+    size_mb = os.path.getsize(path) / 2**20
+    del index, vectors
+
+    before = anonymous_mb()
+    loaded = read_index(path, mmap=True, index_type=index_type)
+    loaded.search(np.zeros((1, DIM), dtype=np.float32), 4)   # touches every stored vector
+    grown = anonymous_mb() - before
+
+    assert loaded.ntotal == (ROWS if index_type == "flat" else 10_000)
+    assert grown < size_mb * 0.1, f"{grown:.1f} MB copied into the heap for a {size_mb:.1f} MB index"
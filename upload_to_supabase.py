@@ -1,6 +1,9 @@
-import os
 from dotenv import load_dotenv
 from supabase_manager import SupabaseStorageManager
+from chunk_store import CHUNK_FILES
+from sparse_index import SPARSE_FILES
+from vector_index import PARAMS_FILE
+from store_versions import upload_version
 
 load_dotenv()
 
@@ -9,10 +12,11 @@ def sync():
     storage = SupabaseStorageManager()
     bucket = "vectorstore-bucket"
     
-    # Path inside bucket: vectorstore/filename
-    # Make sure the local folder 'vectorstore' exists and contains your files
-    storage.upload_file("vectorstore/index.faiss", "vectorstore/index.faiss", bucket)
-    storage.upload_file("vectorstore/index.pkl", "vectorstore/index.pkl", bucket)
+    # Files go to vectorstore/versions/<version>/ and vectorstore/current.json points at them;
+    # running servers pick the new version up without a restart
+    filenames = ["index.faiss", PARAMS_FILE] + CHUNK_FILES + SPARSE_FILES
+    manifest = upload_version(storage, bucket, "vectorstore", "vectorstore", filenames)
+    print(f"📦 Version: {manifest['version']}")
     
     print("🎉 All files synced to Supabase!")
 
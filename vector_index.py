@@ -0,0 +1,333 @@
+import os
+import json
+import time
+import logging
+import threading
+import numpy as np
+import faiss
+from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+from chunk_store import ChunkStore, PositionalIds, write_chunk_store, has_chunk_store
+from embedding_engine import embed_matrix
+from sparse_index import write_sparse_index
+
+logger = logging.getLogger(__name__)
+
+# Build-time configuration
+INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "flat")   # flat | hnsw | ivf_flat | ivf_pq
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))          # 0 = derive from corpus size
+PQ_M = int(os.getenv("PQ_M", "48"))                   # sub-quantizers, must divide dim
+PQ_NBITS = int(os.getenv("PQ_NBITS", "8"))
+TRAIN_SAMPLE = int(os.getenv("INDEX_TRAIN_SAMPLE", "20000"))
+
+# Search-time defaults (persisted with the index, overridable at load)
+DEFAULT_NPROBE = int(os.getenv("FAISS_NPROBE", "0"))
+DEFAULT_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "0"))
+
+# Load-time configuration
+FILTER_EXACT_MAX = int(os.getenv("FILTER_EXACT_MAX", "4096"))   # filtered searches over fewer rows are exact
+USE_MMAP = os.getenv("VECTORSTORE_MMAP", "true").lower() == "true"
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+INDEX_FILE = "index.faiss"
+PARAMS_FILE = "index_params.json"
+
+
+def _nlist_for(n):
+    """Rule of thumb: ~4*sqrt(n) lists, but keep >= 39 training points per list"""
+    nlist = IVF_NLIST or int(4 * np.sqrt(n))
+    return max(1, min(nlist, n // 39 or 1))
+
+
+def _trained_index(vectors, index_type):
+    """Create and train an IVF/PQ index on a sample of vectors; returns (index, params)"""
+    n, dim = vectors.shape
+    nlist = _nlist_for(n)
+    quantizer = faiss.IndexFlatL2(dim)
+    params = {}
+    if index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+    else:
+        if dim % PQ_M:
+            raise ValueError(f"PQ_M={PQ_M} must divide embedding dim {dim}")
+        # k-means wants ~39 training points per centroid, each codebook has 2**nbits
+        nbits = max(1, min(PQ_NBITS, int(np.log2(max(n // 39, 2)))))
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, PQ_M, nbits)
+        params.update(pq_m=PQ_M, pq_nbits=nbits)
+
+    sample = vectors
+    if n > TRAIN_SAMPLE:
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(n, TRAIN_SAMPLE, replace=False)]
+
+    logger.info(f"🏋️ Training {index_type} (nlist={nlist}) on {len(sample):,} vectors...")
+    index.train(sample)
+    params.update(nlist=nlist, train_size=len(sample),
+                  nprobe=DEFAULT_NPROBE or max(1, nlist // 16))
+    return index, params
+
+
+class IndexBuilder:
+    """
+    Builds an index batch by batch. Flat and HNSW indexes take each batch as it
+    arrives; IVF/PQ need the full set for training, so batches are buffered until finish().
+    """
+
+    def __init__(self, index_type=INDEX_TYPE):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+        self.index_type = index_type
+        self.index = None
+        self.params = {"index_type": index_type}
+        self.ntotal = 0
+        self._pending = []
+
+    def add(self, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            return
+        self.ntotal += len(vectors)
+
+        if self.index_type not in ("flat", "hnsw"):
+            self._pending.append(vectors)
+            return
+
+        if self.index is None:
+            dim = vectors.shape[1]
+            if self.index_type == "flat":
+                self.index = faiss.IndexFlatL2(dim)
+            else:
+                self.index = faiss.IndexHNSWFlat(dim, HNSW_M)
+                self.index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+                self.params.update(M=HNSW_M, efConstruction=HNSW_EF_CONSTRUCTION,
+                                   efSearch=DEFAULT_EF_SEARCH or 64)
+        self.index.add(vectors)
+
+    def finish(self):
+        """Return (index, params); trains and fills IVF/PQ indexes here"""
+        if self._pending:
+            vectors = np.concatenate(self._pending)
+            self._pending = []
+            self.index, extra = _trained_index(vectors, self.index_type)
+            self.params.update(extra)
+            self.index.add(vectors)
+
+        if self.index is None:
+            raise ValueError("Cannot build an index from zero vectors")
+
+        self.params.update(dim=self.index.d, ntotal=self.index.ntotal)
+        set_search_params(self.index, nprobe=self.params.get("nprobe"),
+                          ef_search=self.params.get("efSearch"))
+        return self.index, self.params
+
+
+def build_index(vectors, index_type=INDEX_TYPE):
+    """Build (and train, for IVF/PQ) a FAISS index over vectors; returns (index, params)"""
+    builder = IndexBuilder(index_type)
+    builder.add(vectors)
+    return builder.finish()
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """Apply search-time knobs; ignored for index types they don't apply to"""
+    if nprobe:
+        try:
+            faiss.extract_index_ivf(index).nprobe = int(nprobe)
+        except RuntimeError:
+            pass
+    if ef_search and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = int(ef_search)
+
+
+_direct_map_lock = threading.Lock()
+
+
+def reconstruct_rows(index, rows):
+    """Stored vectors for rows (PQ codes decode approximately)"""
+    try:
+        ivf = faiss.extract_index_ivf(index)
+        with _direct_map_lock:
+            if ivf.direct_map.type == faiss.DirectMap.NoMap:
+                ivf.make_direct_map()
+    except RuntimeError:
+        pass
+    return index.reconstruct_batch(rows)
+
+
+def filtered_search(index, vectors, k, rows):
+    """
+    index.search restricted to rows; returns (distances, indices) like index.search.
+    Approximate indexes miss most of a small allowed set, so small sets are scored
+    exactly on their reconstructed vectors; large ones use an ID selector.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    rows = np.asarray(rows, dtype=np.int64)
+    if len(rows) > FILTER_EXACT_MAX:
+        return index.search(vectors, k, params=filter_params(index, rows))
+
+    distances = np.full((len(vectors), k), np.inf, dtype=np.float32)
+    indices = np.full((len(vectors), k), -1, dtype=np.int64)
+    if len(rows) == 0:
+        return distances, indices
+
+    candidates = reconstruct_rows(index, rows)
+    # Squared L2, as IndexFlatL2 reports it
+    scores = (
+        (vectors ** 2).sum(axis=1)[:, None]
+        - 2 * vectors @ candidates.T
+        + (candidates ** 2).sum(axis=1)[None, :]
+    )
+    n = min(k, len(rows))
+    order = np.argsort(scores, axis=1, kind="stable")[:, :n]
+    distances[:, :n] = np.take_along_axis(scores, order, axis=1)
+    indices[:, :n] = rows[order]
+    return distances, indices
+
+
+def filter_params(index, rows):
+    """SearchParameters restricting a search to the given rows, keeping the index's own knobs"""
+    selector = faiss.IDSelectorBatch(np.asarray(rows, dtype=np.int64))
+    if hasattr(index, "hnsw"):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    try:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=faiss.extract_index_ivf(index).nprobe)
+    except RuntimeError:
+        return faiss.SearchParameters(sel=selector)
+
+
+def build_vectorstore(texts, embeddings, index_type=INDEX_TYPE, metadatas=None):
+    """Drop-in replacement for FAISS.from_texts with a configurable index type"""
+    vectors = embed_matrix(embeddings, texts)
+    return build_vectorstore_from_vectors(texts, vectors, embeddings, index_type, metadatas)
+
+
+def build_vectorstore_from_vectors(texts, vectors, embeddings, index_type=INDEX_TYPE, metadatas=None):
+    """Build the store from precomputed vectors (row i embeds texts[i])"""
+    index, params = build_index(vectors, index_type)
+
+    metadatas = metadatas or [{} for _ in texts]
+    ids = [str(i) for i in range(len(texts))]
+    docstore = InMemoryDocstore({
+        doc_id: Document(page_content=text, metadata=meta)
+        for doc_id, text, meta in zip(ids, texts, metadatas)
+    })
+    store = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=dict(enumerate(ids))
+    )
+
+    if index_type != "flat":
+        params["report"] = recall_report(vectors, index)
+
+    return store, params
+
+
+def recall_report(vectors, index, k=10, n_queries=200):
+    """Recall@k and per-query latency of index against an exact flat baseline"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)]
+    k = min(k, len(vectors))
+
+    flat = faiss.IndexFlatL2(vectors.shape[1])
+    flat.add(vectors)
+
+    start = time.perf_counter()
+    _, truth = flat.search(queries, k)
+    flat_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    ann_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    recall = float(np.mean([
+        len(set(t) & set(f)) / k for t, f in zip(truth, found)
+    ]))
+    report = {
+        "k": k,
+        "queries": len(queries),
+        f"recall@{k}": round(recall, 4),
+        "flat_ms_per_query": round(flat_ms, 4),
+        "ann_ms_per_query": round(ann_ms, 4),
+    }
+    logger.info(f"📈 Recall vs flat: {report}")
+    return report
+
+
+def save_vectorstore(store, folder, params):
+    """Persist index.faiss, the columnar chunk store, BM25 postings and build params (no pickle)"""
+    docs = [
+        store.docstore.search(store.index_to_docstore_id[i])
+        for i in range(store.index.ntotal)
+    ]
+    save_index(folder, store.index, params)
+    texts = [d.page_content for d in docs]
+    write_chunk_store(folder, texts, [d.metadata for d in docs])
+    write_sparse_index(folder, texts)
+
+
+def mmap_flags(index_type):
+    """
+    IO_FLAG_MMAP only maps inverted lists (IVF); flat code storage (flat, HNSW) is
+    still copied into the heap unless read with IO_FLAG_MMAP_IFC (faiss >= 1.8).
+    """
+    if index_type in ("flat", "hnsw") and hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        return faiss.IO_FLAG_MMAP_IFC
+    return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+
+
+def read_index(path, mmap=USE_MMAP, index_type="flat"):
+    """Read a FAISS index, memory-mapping its data when supported"""
+    if mmap:
+        try:
+            return faiss.read_index(path, mmap_flags(index_type))
+        except RuntimeError as e:
+            logger.warning(f"⚠️ mmap load not supported for this index ({e}), reading into memory")
+    return faiss.read_index(path)
+
+
+def load_vectorstore_files(folder, embeddings, mmap=USE_MMAP):
+    """Load a saved store; uses the shared mmap chunk store when present"""
+    if not has_chunk_store(folder):
+        # Legacy pickled store; run convert_vectorstore.py to migrate it
+        logger.warning("📦 No chunk store found, falling back to pickled index.pkl")
+        return FAISS.load_local(folder, embeddings, allow_dangerous_deserialization=True)
+
+    index_type = load_index_params(folder).get("index_type", "flat")
+    index = read_index(os.path.join(folder, INDEX_FILE), mmap, index_type)
+    docstore = ChunkStore(folder)
+    if len(docstore) != index.ntotal:
+        raise ValueError(f"Chunk store has {len(docstore)} chunks but index has {index.ntotal}")
+
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=PositionalIds(index.ntotal)
+    )
+
+
+def save_index(folder, index, params):
+    """Persist index.faiss and build params (the chunk store is written separately)"""
+    os.makedirs(folder, exist_ok=True)
+    faiss.write_index(index, os.path.join(folder, INDEX_FILE))
+    save_index_params(folder, params)
+
+
+def save_index_params(folder, params):
+    with open(os.path.join(folder, PARAMS_FILE), "w", encoding="utf-8") as f:
+        json.dump(params, f, indent=2)
+
+
+def load_index_params(folder):
+    """Read persisted build parameters; missing file means a plain flat index"""
+    path = os.path.join(folder, PARAMS_FILE)
+    if not os.path.exists(path):
+        return {"index_type": "flat"}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
@@ -1,20 +1,14 @@
-import os, uuid
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
-from sqlalchemy.orm import Session
-from database import SessionLocal
+import os
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from models import Chat
+from chat_writer import chat_writer
 from google import genai
 from google.genai import types
+from rag_engine import get_answer_async, wait_until_ready
+from readiness import NotReadyError
 
 router = APIRouter(prefix="/voice")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # Lazy client initialization
 _client = None
 
@@ -36,46 +30,52 @@ def get_gemini_client():
 @router.post("/")
 async def voice_chat(
     file: UploadFile = File(...), 
-    user_id: str = Form("default_user"),
-    db: Session = Depends(get_db)
+    user_id: str = Form("default_user")
 ):
     """
     Voice chat endpoint - accepts audio file
-    Transcribes and responds using Gemini
+    Transcribes with Gemini, then answers through the async RAG pipeline
     """
+    # Don't pay for a transcription the knowledge base can't answer yet
+    await wait_until_ready()
+
     audio_bytes = await file.read()
     
     try:
         client = get_gemini_client()
         
-        # Step 1: Gemini handles transcription + logic
-        model_res = client.models.generate_content(
+        # Step 1: Gemini transcription (async client, does not block the loop)
+        model_res = await client.aio.models.generate_content(
             model="gemini-2.0-flash",
             contents=[
-                "Transcribe the audio and provide a helpful response. Format: [Transcription] | [Response]",
+                "Transcribe the audio. Reply with the transcription only.",
                 types.Part.from_bytes(data=audio_bytes, mime_type=file.content_type)
             ]
         )
         
-        full_text = model_res.text
-        parts = full_text.split("|")
-        user_text = parts[0].strip() if len(parts) > 1 else "Voice Message"
-        ai_text = parts[-1].strip()
+        user_text = (model_res.text or "").strip()
+        if not user_text:
+            # Nothing to answer: don't run (and save) a placeholder question
+            raise HTTPException(status_code=422, detail="Could not transcribe the audio, please try again")
+
+        # Step 2: Answer from the knowledge base
+        ai_text = await get_answer_async(question=user_text)
 
-        # Step 2: Save to DB
+        # Step 3: Save to DB
         new_chat = Chat(
             user_id=user_id, 
             session_id="voice_session", 
             question=user_text, 
             answer=ai_text
         )
-        db.add(new_chat)
-        db.commit()
+        await chat_writer.put(new_chat)
 
         return {
             "user_said": user_text,
             "message": ai_text,
             "status": "success"
         }
+    except (NotReadyError, HTTPException):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file